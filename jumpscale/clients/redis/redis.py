@@ -4,8 +4,6 @@ Redis client
 
 from redis import Redis
 
-from jumpscale.core import events
-
 from jumpscale.clients.base import Client
 from jumpscale.core.base import fields
 from jumpscale.core.base.events import AttributeUpdateEvent
@@ -16,6 +14,10 @@ class RedisClientAttributeUpdated(AttributeUpdateEvent):
 
 
 class RedisClient(Client):
+    # this will allow other people to listen to this event too
+    # (listeners of AttributeUpdateEvent are notified too)
+    _attr_update_event = RedisClientAttributeUpdated
+
     hostname = fields.String(default="localhost")
     port = fields.Integer(default=6379)
     password = fields.Secret()
@@ -26,10 +28,6 @@ class RedisClient(Client):
 
     def _attr_updated(self, name, value):
         super()._attr_updated(name, value)
-        # this will allow other people to listen to this event too
-        event = RedisClientAttributeUpdated(self, name, value)
-        events.notify(event)
-
         # reset client
         self.__client = None
 
@@ -3,10 +3,15 @@ class InstanceEvent:
         self.instance = instance
         self.factory = factory
 
+    @property
+    def target(self):
+        # listeners added with a factory as a target are notified only of events of this factory
+        return self.factory
+
 
 class AttributeUpdateEvent(InstanceEvent):
-    def __init__(self, instance, name, new_value):
-        super().__init__(instance=instance)
+    def __init__(self, instance, name, new_value, factory=None):
+        super().__init__(instance=instance, factory=factory)
         self.name = name
         self.new_value = new_value
 
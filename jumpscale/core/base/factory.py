@@ -6,19 +6,118 @@ The backend to store configurations
 - Multiple backends (InMemoryStore, FileSystemStore, RedisStore)
 
 """
+import atexit
+import gzip
+import io
+import threading
+
 from functools import partial
+
+import msgpack
+
 from jumpscale.core import config, events
+from jumpscale.data.serializers import json
 
 from .events import AttributeUpdateEvent, InstanceCreateEvent, InstanceDeleteEvent
-from .store import Location, FileSystemStore, RedisStore
+from .store import Location, FileSystemStore, RedisStore, SQLiteStore, get_store
 
-STORES = {"filesystem": FileSystemStore, "redis": RedisStore}
+STORES = {"filesystem": FileSystemStore, "redis": RedisStore, "sqlite": SQLiteStore}
 
 
 class DuplicateError(Exception):
     pass
 
 
+class WriteBehind:
+    """
+    collects instances that need to be saved, and saves them in a background thread after a delay
+
+    pending saves are also done at exit, or explicitly using `flush`.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, save, instance, delay):
+        """
+        schedule a save of this instance, if it's already scheduled, it will be saved only once
+
+        Args:
+            save (callable): a function that takes the instance and saves it
+            instance (Base): instance
+            delay (float): seconds to wait before saving (if no save is scheduled already)
+        """
+        with self.lock:
+            self.pending[id(instance)] = (save, instance)
+            if self.timer is None:
+                self.timer = threading.Timer(delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """save all pending instances now"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        for save, instance in pending.values():
+            save(instance)
+
+
+write_behind = WriteBehind()
+atexit.register(write_behind.flush)
+
+
+def get_indexed_fields(type_):
+    return {name: field for name, field in type_._fields.items() if field.indexed}
+
+
+def get_index_values(indexed_fields, data):
+    """
+    get values of indexed fields from raw data
+
+    Args:
+        indexed_fields (dict): field name -> field
+        data (dict): raw data, can be partial
+
+    Returns:
+        dict: field name -> raw value, None if it cannot be indexed
+    """
+    values = {}
+    for field_name in indexed_fields:
+        if field_name not in data and f"__{field_name}" not in data:
+            # not saved (partial save)
+            continue
+
+        # secret fields are stored with a different key, so they are never indexed
+        value = data.get(field_name)
+        if not isinstance(value, (str, int, float, bool)):
+            value = None
+        values[field_name] = value
+    return values
+
+
+def get_stored_factory_fields(type_):
+    """
+    get factory fields of a type that are stored
+
+    Args:
+        type_ (type): `Base` type
+
+    Returns:
+        dict: field name -> factory field
+    """
+    return {
+        name: field
+        for name, field in type_._fields.items()
+        if isinstance(getattr(field, "factory_type", None), type) and issubclass(field.factory_type, StoredFactory)
+    }
+
+
 class Factory:
     def __init__(self, type_, name_=None, parent_instance_=None, parent_factory_=None):
         self.__name = name_
@@ -52,6 +151,7 @@ class Factory:
 
         instance = self.type(*args, **kwargs)
         instance._set_instance_name(name)
+        instance._set_factory(self)
         # parent instance of this factory is a parent to all of its instances
         instance._set_parent(self.parent_instance)
         setattr(self, name, instance)
@@ -91,15 +191,28 @@ class Factory:
 
 
 class StoredFactory(events.Handler, Factory):
+    """
+    a factory where instances are stored using the configured store
+
+    stored instances are not loaded all at once, only their names are registered when the factory is loaded,
+    and every instance is loaded (materialized) on first access, using `get`, `find` or as an attribute.
+    """
+
     STORE = STORES[config.get_config()["store"]]
+    EXPORT_BATCH_SIZE = 1000
+    IMPORT_BATCH_SIZE = 1000
 
     def __init__(self, type_, name_=None, parent_instance_=None, parent_factory_=None):
+        # names of stored instances that are not materialized yet
+        self.__pending = set()
+        self.__write_behind_delay = None
         super().__init__(type_, name_=name_, parent_instance_=parent_instance_, parent_factory_=parent_factory_)
 
         if not parent_instance_:
             self._load()
 
-        events.add_listenter(self, AttributeUpdateEvent)
+        # only notified of updates of this factory instances, and removed when this factory is garbage collected
+        events.add_listenter(self, AttributeUpdateEvent, target=self, weak=True)
 
     @property
     def parent_location(self):
@@ -138,19 +251,91 @@ class StoredFactory(events.Handler, Factory):
 
     @property
     def store(self):
-        return self.STORE(self.location)
+        return get_store(self.STORE, self.location)
+
+    def _get_indexed_fields(self):
+        return get_indexed_fields(self.type)
+
+    def _update_index(self, name, data):
+        values = get_index_values(self._get_indexed_fields(), data)
+        if values:
+            self.store.update_field_index(name, values)
 
     def _validate_and_save_instance(self, name, instance):
         instance.validate()
-        self.store.save(name, instance._get_data())
+        dirty_fields = instance._take_dirty_fields()
+        try:
+            # secrets that were not decrypted are saved as is
+            data = instance._get_data(keep_encrypted=True)
+            self.store.save(name, data)
+            self._update_index(name, data)
+        except Exception:
+            instance._restore_dirty_fields(dirty_fields)
+            raise
+
+    def _save_changes(self, name, instance):
+        """
+        save only changed (dirty) fields of an instance if they are known, or all fields otherwise
+
+        Args:
+            name (str): instance name
+            instance (Base): instance
+        """
+        dirty_fields = instance._get_dirty_fields()
+        if dirty_fields is None:
+            self._validate_and_save_instance(name, instance)
+            return
+
+        if not dirty_fields:
+            return
+
+        instance.validate()
+        # taken before getting the data, fields set while saving (e.g. in write-behind mode) are saved next time
+        dirty_fields = instance._take_dirty_fields()
+        try:
+            data = instance._get_data(keep_encrypted=True, names=dirty_fields)
+            self.store.save_partial(name, data)
+            self._update_index(name, data)
+        except Exception:
+            instance._restore_dirty_fields(dirty_fields)
+            raise
 
     def _try_save_instance(self, instance):
         # try to save instance if it's validated
         try:
-            self._validate_and_save_instance(name, instance)
+            self._save_changes(instance.instance_name, instance)
         except:
             pass
 
+    def set_write_behind(self, delay):
+        """
+        enable or disable write-behind mode for this factory and its sub-factories
+
+        in write-behind mode, instances updated (by setting attributes) are saved in a background thread
+        after `delay` seconds (or at exit), so many updates result in one save.
+
+        Args:
+            delay (float or None): seconds to wait before saving, None to disable and save on every update
+        """
+        self.__write_behind_delay = delay
+        if delay is None:
+            write_behind.flush()
+
+        for instance in list(vars(self).values()):
+            if isinstance(instance, self.type):
+                for factory in instance._get_factories().values():
+                    if isinstance(factory, StoredFactory):
+                        factory.set_write_behind(delay)
+
+    def _schedule_save(self, instance):
+        if instance._is_batching():
+            # will be saved once when the batch is done
+            instance._defer(self._schedule_save)
+        elif self.__write_behind_delay is not None:
+            write_behind.add(self._try_save_instance, instance, self.__write_behind_delay)
+        else:
+            self._try_save_instance(instance)
+
     def handle(self, ev):
         """
         handle when data is updated for an instance
@@ -159,12 +344,18 @@ class StoredFactory(events.Handler, Factory):
             ev (AttributeUpdateEvent): attribute update event
         """
         instance = ev.instance
-        if instance.parent == self.parent_instance and isinstance(instance, self.type):
-            self._try_save_instance(instance)
+        if not isinstance(instance, self.type) or instance.instance_name is None:
+            return
+
+        # only save instances of this factory
+        if self.__dict__.get(instance.instance_name) is instance:
+            self._schedule_save(instance)
 
     def _load_sub_factories(self, name, instance):
         for factory in instance._get_factories().values():
             factory._set_parent_factory(self)
+            if isinstance(factory, StoredFactory) and self.__write_behind_delay is not None:
+                factory.set_write_behind(self.__write_behind_delay)
             factory._load()
 
     def new(self, name, *args, **kwargs):
@@ -175,25 +366,325 @@ class StoredFactory(events.Handler, Factory):
         return instance
 
     def _load(self):
-        for name in self.store.list_all():
-            instance = self.new(name)
-            instance._set_data(self.store.get(name))
+        """register names of stored instances only, they will be materialized on first access"""
+        names = set(self.store.list_all()).difference(super().list_all(), self.__pending)
+        self.__pending.update(names)
+        self.count += len(names)
+
+    def _materialize_many(self, names):
+        """
+        create instances of stored names that are not materialized yet, using their stored data
+
+        Args:
+            names (list of str): instance names
+        """
+        names = [name for name in names if name in self.__pending]
+        if not names:
+            return
+
+        configs = self.store.get_many(names, lazy=True)
+        for name in names:
+            self.__pending.discard(name)
+            # already counted when loaded
+            self.count -= 1
+            if name in configs:
+                instance = self.new(name)
+                instance._set_data(configs[name])
+                instance._mark_clean()
+
+    def __getattr__(self, name):
+        # only called if the attribute is not found, e.g. a stored instance that is not materialized yet
+        pending = self.__dict__.get("_StoredFactory__pending")
+        if pending and name in pending:
+            self._materialize_many([name])
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
     def delete(self, name):
         self.store.delete(name)
+        indexed_fields = self._get_indexed_fields()
+        if indexed_fields:
+            self.store.remove_from_field_index(name, list(indexed_fields))
+        self.__pending.discard(name)
         super(StoredFactory, self).delete(name)
 
-    def list_all(self):
+    def _get_indexed_field(self, field_name):
+        field = self._get_indexed_fields().get(field_name)
+        if not field:
+            raise ValueError(f"field '{field_name}' of {self.type.__name__} is not indexed")
+        return field
+
+    def _get_raw_value(self, field, value):
+        return field.to_raw(field.from_raw(value))
+
+    def find_by(self, **values):
         """
-        get all instance names (stored or not)
+        find instances by values of indexed fields (fields defined with `indexed=True`)
+
+        ```
+        factory.find_by(email="a@b.com", active=True)
+        ```
+
+        instances are materialized only if they match all given values.
+
+        Args:
+            values: field name -> value
+
+        Raises:
+            ValueError: if a field is not indexed
+
+        Returns:
+            list: matching instances
+        """
+        names = None
+        for field_name, value in values.items():
+            field = self._get_indexed_field(field_name)
+            found = self.store.find_in_field_index(field_name, self._get_raw_value(field, value))
+            names = found if names is None else names.intersection(found)
+            if not names:
+                return []
+
+        return self._get_instances(names or [])
+
+    def find_range(self, field_name, min=None, max=None):
+        """
+        find instances with a numeric (or date/time) indexed field value in a range, both ends are inclusive
+
+        ```
+        factory.find_range("created", min=datetime.datetime(2020, 1, 1))
+        ```
+
+        Args:
+            field_name (str): field name
+            min (any, optional): minimum value. Defaults to None (no minimum).
+            max (any, optional): maximum value. Defaults to None (no maximum).
+
+        Raises:
+            ValueError: if the field is not indexed
+
+        Returns:
+            list: matching instances
+        """
+        field = self._get_indexed_field(field_name)
+        if min is not None:
+            min = self._get_raw_value(field, min)
+        if max is not None:
+            max = self._get_raw_value(field, max)
+        return self._get_instances(self.store.find_in_field_range(field_name, min, max))
+
+    def _get_instances(self, names):
+        names = sorted(names)
+        self._materialize_many(names)
+        return [self.__dict__[name] for name in names if isinstance(self.__dict__.get(name), self.type)]
+
+    def rebuild_index(self):
+        """
+        rebuild indexes of all indexed fields from stored instances, e.g. after adding `indexed=True` to a field
+        """
+        indexed_fields = self._get_indexed_fields()
+        if not indexed_fields:
+            return
+
+        self.store.clear_field_index(list(indexed_fields))
+        for instance in self:
+            self._update_index(instance.instance_name, instance._get_data())
+
+    def list_all(self, loaded_only=False):
+        """
+        get all instance names (stored or not), this does not materialize any instance
+
+        Args:
+            loaded_only (bool, optional): only get names of materialized instances. Defaults to False.
 
         Returns:
             list of str: names
         """
+        if loaded_only:
+            return set(super().list_all())
+
         names = set(self.store.list_all())
-        return names.union(super().list_all())
+        return names.union(self.__pending, super().list_all())
+
+    def _iter_records(self, store_type, type_, location, root_location):
+        """
+        get records of all stored instances in a location and its sub-locations (using stores only),
+        in batches of `EXPORT_BATCH_SIZE`
+
+        Args:
+            store_type (type): store type
+            type_ (type): `Base` type of instances
+            location (Location): location
+            root_location (Location): location of the exported factory
+
+        Yields:
+            tuple: (relative location name list, instance name, raw stored data as a json string)
+        """
+        store = get_store(store_type, location)
+        relative_location = location.name_list[len(root_location.name_list) :]
+        factory_fields = get_stored_factory_fields(type_)
+
+        names = sorted(store.list_all())
+        for i in range(0, len(names), self.EXPORT_BATCH_SIZE):
+            batch = names[i : i + self.EXPORT_BATCH_SIZE]
+            data = store.read_many(batch)
+            for name in batch:
+                if name not in data:
+                    continue
+
+                value = data[name]
+                if isinstance(value, bytes):
+                    value = value.decode()
+                yield relative_location, name, value
+
+                for field_name, field in factory_fields.items():
+                    sub_location = Location(
+                        *location.name_list, name, field_name, *Location.from_type(field.type).name_list
+                    )
+                    yield from self._iter_records(field.factory_type.STORE, field.type, sub_location, root_location)
+
+    def _resolve_type(self, relative_location):
+        """
+        get the type of instances stored in a location relative to this factory location
+
+        Args:
+            relative_location (list of str): relative location name list
+
+        Returns:
+            tuple: (type, store type), or (None, None) if it's not a location of a sub-factory
+        """
+        type_, store_type = self.type, self.STORE
+        parts = list(relative_location)
+        while parts:
+            if len(parts) < 2:
+                return None, None
+            field = get_stored_factory_fields(type_).get(parts[1])
+            if not field:
+                return None, None
+
+            type_, store_type = field.type, field.factory_type.STORE
+            type_location = Location.from_type(type_).name_list
+            if parts[2 : 2 + len(type_location)] != type_location:
+                return None, None
+            parts = parts[2 + len(type_location) :]
+        return type_, store_type
+
+    def export(self, stream, format_="msgpack", compress=True):
+        """
+        export all stored instances of this factory and of its sub-factories (recursively) to a binary stream
+
+        data is exported as stored, secret fields stay encrypted, so it can be only imported
+        where the same private key is used.
+
+        ```python
+        with open("/tmp/clients.gz", "wb") as f:
+            factory.export(f)
+        ```
+
+        Args:
+            stream (file): binary file object
+            format_ (str, optional): "msgpack" or "jsonl" (json lines). Defaults to "msgpack".
+            compress (bool, optional): compress using gzip. Defaults to True.
+
+        Raises:
+            ValueError: if the format is not supported
+
+        Returns:
+            int: number of exported instances
+        """
+        if format_ not in ("msgpack", "jsonl"):
+            raise ValueError(f"format '{format_}' is not supported")
+
+        out = gzip.GzipFile(fileobj=stream, mode="wb") if compress else stream
+        packer = msgpack.Packer(use_bin_type=True)
+
+        count = 0
+        try:
+            for relative_location, name, data in self._iter_records(
+                self.STORE, self.type, self.location, self.location
+            ):
+                if format_ == "msgpack":
+                    out.write(packer.pack([relative_location, name, json.loads(data)]))
+                else:
+                    # data is json already
+                    out.write(f"[{json.dumps(relative_location)}, {json.dumps(name)}, {data}]\n".encode())
+                count += 1
+        finally:
+            if compress:
+                out.close()
+        return count
+
+    def _read_records(self, stream):
+        if not hasattr(stream, "peek"):
+            stream = io.BufferedReader(stream)
+        if stream.peek(2)[:2] == b"\x1f\x8b":
+            stream = io.BufferedReader(gzip.GzipFile(fileobj=stream, mode="rb"))
+
+        if stream.peek(1)[:1] == b"[":
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from msgpack.Unpacker(stream, raw=False)
+
+    def import_(self, stream):
+        """
+        import instances exported using `export` (from any factory of the same type) to this factory,
+        they're written in batches of `IMPORT_BATCH_SIZE` using bulk writes of the stores.
+
+        existing stored instances with the same names are overwritten, but already materialized instances
+        keep their current data.
+
+        Args:
+            stream (file): binary file object, format and compression are detected automatically
+
+        Returns:
+            int: number of imported instances
+        """
+        pending = {}
+        count = 0
+
+        def write(relative_location):
+            type_, store_type = self._resolve_type(relative_location)
+            items = pending.pop(relative_location)
+            if type_ is None:
+                return 0
+
+            store = get_store(store_type, Location(*self.location.name_list, *relative_location))
+            store.write_many({name: json.dumps(data) for name, data in items.items()})
+
+            indexed_fields = get_indexed_fields(type_)
+            if indexed_fields:
+                store.update_field_index_many(
+                    {name: get_index_values(indexed_fields, data) for name, data in items.items()}
+                )
+            return len(items)
+
+        for relative_location, name, data in self._read_records(stream):
+            relative_location = tuple(relative_location)
+            items = pending.setdefault(relative_location, {})
+            items[name] = data
+            if len(items) >= self.IMPORT_BATCH_SIZE:
+                count += write(relative_location)
+
+        for relative_location in list(pending):
+            count += write(relative_location)
+
+        self._reload()
+        return count
+
+    def _reload(self):
+        """register names of stored instances of this factory and sub-factories of materialized instances"""
+        self._load()
+        for instance in list(vars(self).values()):
+            if isinstance(instance, self.type):
+                for factory in instance._get_factories().values():
+                    if isinstance(factory, StoredFactory):
+                        factory._reload()
 
     def __iter__(self):
-        for value in vars(self).values():
+        # materialize all at once, using bulk reads of the store
+        self._materialize_many(list(self.__pending))
+        for value in list(vars(self).values()):
             if isinstance(value, self.type):
                 yield value
@@ -1,3 +1,7 @@
+import datetime
+import enum
+
+from contextlib import contextmanager
 from types import SimpleNamespace
 
 from jumpscale.core import events
@@ -5,17 +9,84 @@ from jumpscale.core import events
 from . import fields
 from .factory import Factory, StoredFactory, DuplicateError
 from .events import AttributeUpdateEvent
+from .store import EncryptedValue
+
+
+IMMUTABLE_TYPES = (
+    type(None),
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    bool,
+    frozenset,
+    enum.Enum,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+)
+
+
+def is_immutable(value):
+    return isinstance(value, IMMUTABLE_TYPES)
+
+
+def is_identity(field, method_name):
+    # to_raw/from_raw of this field type returns the same value
+    return getattr(type(field), method_name) is getattr(fields.Field, method_name)
+
 
+def get_default_getter(field):
+    """
+    get a function that returns the default value of a field, it's computed only once if it's immutable
 
-def get_field_property(name, field):
+    Args:
+        field (fields.Field): field
+
+    Returns:
+        function: default value getter
+    """
+    # accept raw value as default too
+    default = field.from_raw(field.default)
+    if is_immutable(default):
+        return lambda: default
+    return lambda: field.from_raw(field.default)
+
+
+FIELD_SLOT_PREFIX = "_f_"
+
+
+def get_slot_name(name):
+    return f"{FIELD_SLOT_PREFIX}{name}"
+
+
+def get_field_property(name, field, compact=False):
     inner_name = f"__{name}"
+    slot_name = get_slot_name(name)
+    get_default = get_default_getter(field)
 
     def getter(self):
-        if hasattr(self, inner_name):
-            return getattr(self, inner_name)
-
-        # accept raw value as default too
-        return field.from_raw(field.default)
+        try:
+            return self.__dict__[inner_name]
+        except KeyError:
+            return get_default()
+
+    def slot_getter(self):
+        try:
+            return getattr(self, slot_name)
+        except AttributeError:
+            return get_default()
+
+    if compact:
+        getter = slot_getter
+
+    def secret_getter(self):
+        value = getter(self)
+        if isinstance(value, EncryptedValue):
+            # decrypted only once, on first access
+            return value.get()
+        return value
 
     def setter(self, value):
         if field.readonly:
@@ -33,16 +104,269 @@ def get_field_property(name, field):
 
         # se attribute
         setattr(self, inner_name, value)
+        self._mark_dirty(name)
         self._attr_updated(name, value)
 
+    if isinstance(field, fields.Secret):
+        return property(fget=secret_getter, fset=setter)
     return property(fget=getter, fset=setter)
 
 
+def is_base(value):
+    return isinstance(value, Base)
+
+
+def compile_function(source, namespace, doc):
+    exec(source, namespace)
+    fun = namespace[source.split("(", 1)[0][len("def ") :]]
+    fun.__doc__ = doc
+    fun._compiled = True
+    return fun
+
+
+def get_inner_value(name, compact):
+    # an expression to get the inner value of a field (or None) in generated code
+    if compact:
+        return f"getattr(self, {get_slot_name(name)!r}, None)"
+    return f"d.get({f'__{name}'!r})"
+
+
+def get_inner_target(name, compact):
+    # an assignment target of the inner value of a field in generated code
+    if compact:
+        return f"self.{get_slot_name(name)}"
+    return f"d[{f'__{name}'!r}]"
+
+
+def compile_init_fields(cls_fields, namespace, compact):
+    lines = ["def _init_fields(self, values):", "    d = self.__dict__", "    factories = self._factories = {}"]
+    for i, (name, field) in enumerate(cls_fields.items()):
+        key, target = repr(name), get_inner_target(name, compact)
+        namespace[f"field{i}"] = field
+        if isinstance(field, fields.Factory):
+            lines.append(
+                f"    {target} = factories[{key}] = "
+                f"field{i}.factory_type(field{i}.type, name_={key}, parent_instance_=self)"
+            )
+            continue
+
+        default = field.from_raw(field.default)
+        if is_immutable(default):
+            namespace[f"default{i}"] = default
+            lines.append(f"    {target} = values.get({key}, default{i})")
+        else:
+            lines.append(f"    {target} = values[{key}] if {key} in values else field{i}.from_raw(field{i}.default)")
+
+    return compile_function("\n".join(lines), namespace, "set initial values of all fields, used by `Base.__init__`")
+
+
+def compile_get_data(cls_fields, properties, namespace, compact):
+    lines = [
+        "def _get_data(self, keep_encrypted=False, names=None):",
+        "    if self.__class__ is not cls:",
+        "        # called from a subclass that overrides it",
+        "        return self.__class__._compiled_methods['_get_data'](self, keep_encrypted, names)",
+        "    d = self.__dict__",
+        "    data = {}",
+    ]
+    for i, (name, field) in enumerate(cls_fields.items()):
+        if isinstance(field, fields.Factory):
+            # skip for factories for now
+            continue
+
+        key, inner_key = repr(name), repr(f"__{name}")
+        namespace[f"field{i}"] = field
+        namespace[f"get{i}"] = properties[name].fget
+        to_raw = "" if is_identity(field, "to_raw") else f"field{i}.to_raw"
+        lines.append(f"    if names is None or {key} in names:")
+
+        if isinstance(field, fields.Secret):
+            lines += [
+                f"        value = {get_inner_value(name, compact)}",
+                "        if keep_encrypted and isinstance(value, EncryptedValue):",
+                f"            data[{inner_key}] = value",
+                "        else:",
+                f"            data[{inner_key}] = {to_raw}(get{i}(self))",
+            ]
+        elif isinstance(field, fields.Object):
+            lines += [
+                f"        value = get{i}(self)",
+                "        if keep_encrypted and is_base(value):",
+                f"            data[{key}] = value._get_data(keep_encrypted=True)",
+                "        else:",
+                f"            data[{key}] = {to_raw}(value)",
+            ]
+        else:
+            lines.append(f"        data[{key}] = {to_raw}(get{i}(self))")
+
+    lines.append("    return data")
+    doc = """
+    get raw data of this instance
+
+    Args:
+        keep_encrypted (bool, optional): keep secret values that are not decrypted yet
+                                         as `EncryptedValue` objects. Defaults to False.
+        names (set of str, optional): get the data of these fields only. Defaults to None (all fields).
+
+    Returns:
+        dict: raw data, secret fields are prefixed with `__`
+    """
+    return compile_function("\n".join(lines), namespace, doc)
+
+
+def compile_set_data(cls_fields, namespace, compact):
+    lines = [
+        "def _set_data(self, new_data):",
+        "    if self.__class__ is not cls:",
+        "        # called from a subclass that overrides it",
+        "        return self.__class__._compiled_methods['_set_data'](self, new_data)",
+        "    d = self.__dict__",
+    ]
+    for i, (name, field) in enumerate(cls_fields.items()):
+        if isinstance(field, fields.Factory):
+            continue
+
+        key, target = repr(name), get_inner_target(name, compact)
+        namespace[f"field{i}"] = field
+        lines += [f"    if {key} in new_data:", f"        value = new_data[{key}]"]
+        if isinstance(field, fields.Secret):
+            lines += [
+                "        if isinstance(value, EncryptedValue):",
+                "            # will be decrypted on first access",
+                f"            {target} = value",
+                "        else:",
+            ]
+            indent = " " * 12
+        else:
+            indent = " " * 8
+
+        if is_identity(field, "from_raw"):
+            lines.append(f"{indent}{target} = value")
+        else:
+            lines += [
+                f"{indent}try:",
+                f"{indent}    {target} = field{i}.from_raw(value)",
+                f"{indent}except (ValidationError, ValueError):",
+                f"{indent}    # should at least log validation and value errors",
+                f"{indent}    # this can happen in case of e.g. fields type change",
+                f"{indent}    pass",
+            ]
+
+    return compile_function("\n".join(lines), namespace, "set raw data of this instance (e.g. as loaded from a store)")
+
+
+def compile_methods(new_class, cls_fields, properties, compact):
+    """
+    generate `_init_fields`, `_get_data` (and `to_dict`) and `_set_data` specialized for the fields of a class
+
+    Args:
+        new_class (type): class
+        cls_fields (dict): field name -> field
+        properties (dict): field name -> property
+        compact (bool): field values are stored in slots
+
+    Returns:
+        dict: method name -> function
+    """
+    namespace = {
+        "cls": new_class,
+        "EncryptedValue": EncryptedValue,
+        "ValidationError": fields.ValidationError,
+        "is_base": is_base,
+    }
+    get_data = compile_get_data(cls_fields, properties, namespace, compact)
+    methods = {
+        "_init_fields": compile_init_fields(cls_fields, namespace, compact),
+        "_get_data": get_data,
+        "to_dict": get_data,
+        "_set_data": compile_set_data(cls_fields, namespace, compact),
+    }
+    if compact:
+        methods["__eq__"] = compact_eq
+        methods["__ne__"] = compact_ne
+        methods["__reduce__"] = compact_reduce
+        methods["__repr__"] = compact_repr
+    return methods
+
+
+# attributes of `Base` itself, stored in slots too in compact mode
+BASE_SLOTS = (
+    "_Base__parent",
+    "_Base__instance_name",
+    "_Base__factory",
+    "_Base__batch_depth",
+    "_Base__deferred",
+    "_Base__dirty",
+    "_factories",
+)
+
+
+def get_all_slots(cls):
+    return [slot for klass in cls.__mro__ for slot in klass.__dict__.get("__slots__", ())]
+
+
+def compact_eq(self, other):
+    # SimpleNamespace only compares __dict__
+    if not isinstance(other, SimpleNamespace):
+        return NotImplemented
+    if self.__dict__ != other.__dict__:
+        return False
+
+    missing = object()
+    for slot in self._all_slots:
+        if getattr(self, slot, missing) != getattr(other, slot, missing):
+            return False
+    return True
+
+
+def compact_ne(self, other):
+    equal = compact_eq(self, other)
+    if equal is NotImplemented:
+        return equal
+    return not equal
+
+
+def get_slots_state(obj):
+    missing = object()
+    state = {}
+    for slot in obj._all_slots:
+        value = getattr(obj, slot, missing)
+        if value is not missing:
+            state[slot] = value
+    return state
+
+
+def compact_reduce(self):
+    # SimpleNamespace only copies/pickles __dict__, slots state is set after __dict__ (see `copy` and `pickle`)
+    return type(self), (), (self.__dict__ or None, get_slots_state(self))
+
+
+def compact_repr(self):
+    # same as SimpleNamespace repr of a non-compact instance, field values are shown as `__<name>`
+    items = dict(self.__dict__)
+    for slot, value in get_slots_state(self).items():
+        if slot.startswith(FIELD_SLOT_PREFIX):
+            slot = f"__{slot[len(FIELD_SLOT_PREFIX):]}"
+        items[slot] = value
+    values = ", ".join(f"{key}={value!r}" for key, value in sorted(items.items()))
+    return f"{type(self).__name__}({values})"
+
+
+compact_eq._compiled = compact_ne._compiled = compact_reduce._compiled = compact_repr._compiled = True
+
+
 class BaseMeta(type):
     def __new__(cls, name, based, attrs):
         """
         get a new class with all fields set in _fields, including base/super class fields too.
 
+        `_init_fields`, `_get_data` (and `to_dict`) and `_set_data` are generated for every class,
+        unless they are defined by the class (or a super class other than the generated ones).
+
+        if `_compact` is set to True (in the class or a super class), values of fields and attributes of `Base`
+        are stored in slots instead of the instance `__dict__`, which takes less memory per instance,
+        `__eq__`, `__reduce__` (copy and pickle) and `__repr__` are generated to include slots too.
+
         Args:
             name (str): class name
             based (tuple): super class types (classes)
@@ -53,6 +377,7 @@ class BaseMeta(type):
         """
         cls_fields = {}
         super_fields = {}
+        properties = {}
 
         for super_cls in based:
             if hasattr(super_cls, "_fields"):
@@ -61,37 +386,65 @@ class BaseMeta(type):
         # update current attrs with super class fields
         attrs.update(super_fields)
 
+        compact = attrs.get("_compact", any(getattr(super_cls, "_compact", False) for super_cls in based))
+        existing_slots = {slot for super_cls in based for slot in get_all_slots(super_cls)}
+
         new_attrs = {}
+        slots = []
         for key in attrs:
             obj = attrs[key]
             if isinstance(obj, fields.Field):
                 cls_fields[key] = obj
-                new_attrs[key] = get_field_property(key, obj)
+                new_attrs[key] = properties[key] = get_field_property(key, obj, compact=compact)
+                if compact and get_slot_name(key) not in existing_slots:
+                    slots.append(get_slot_name(key))
             else:
                 new_attrs[key] = obj
 
+        if compact:
+            slots += [slot for slot in BASE_SLOTS if slot not in existing_slots]
+            new_attrs["__slots__"] = tuple(slots)
+
         new_class = super(BaseMeta, cls).__new__(cls, name, based, new_attrs)
         new_class._fields = cls_fields
+
+        if compact:
+            new_class._all_slots = get_all_slots(new_class)
+            for key in cls_fields:
+                # so inner values can still be accessed as `__<name>`, e.g. using getattr/setattr
+                setattr(new_class, f"__{key}", getattr(new_class, get_slot_name(key)))
+
+        new_class._compiled_methods = compile_methods(new_class, cls_fields, properties, compact)
+        for method_name, method in new_class._compiled_methods.items():
+            current = getattr(new_class, method_name, None)
+            inherited_from_namespace = current is getattr(SimpleNamespace, method_name, None)
+            if current is None or inherited_from_namespace or getattr(current, "_compiled", False):
+                setattr(new_class, method_name, method)
         return new_class
 
 
 class Base(SimpleNamespace, metaclass=BaseMeta):
+    """
+    base type for all configuration objects, fields are defined as class attributes (see `fields`).
+
+    set `_compact = True` in a subclass to store field values in slots (see `BaseMeta`).
+    """
+
+    _compact = False
+    # type of events sent when an attribute is updated
+    _attr_update_event = AttributeUpdateEvent
+
     def __init__(self, parent_=None, instance_name_=None, **values):
         self.__parent = parent_
         self.__instance_name = instance_name_
+        self.__factory = None
+        self.__batch_depth = 0
+        self.__deferred = {}
+        # names of fields changed since the last load/save, None if not known (e.g. not loaded or saved yet)
+        self.__dirty = None
 
-        self._factories = {}
-
-        for name, field in self._get_fields().items():
-            if isinstance(field, fields.Factory):
-                value = field.factory_type(field.type, name_=name, parent_instance_=self)
-                self._factories[name] = value
-            else:
-                value = values.get(name, field.from_raw(field.default))
-
-            # accept raw as a default value
-            # and set inner value
-            setattr(self, f"__{name}", value)
+        # generated by BaseMeta
+        self._init_fields(values)
 
     def _get_fields(self):
         return self._fields
@@ -102,38 +455,110 @@ class Base(SimpleNamespace, metaclass=BaseMeta):
     def _get_embedded_objects(self):
         return [getattr(self, name) for name, field in self._get_fields().items() if isinstance(field, fields.Object)]
 
-    def _get_data(self):
-        data = {}
+    def _attr_updated(self, name, value):
+        event = self._attr_update_event(self, name, value, factory=self.__factory)
+        events.notify(event)
+
+        parent = self.parent
+        if isinstance(parent, Base):
+            parent._child_updated(self)
 
+    def _child_updated(self, child):
+        # an embedded object is updated, the field holding it is changed too
         for name, field in self._get_fields().items():
-            if isinstance(field, fields.Factory):
-                # skip for factories for now
-                continue
-            value = getattr(self, name)
-            raw_value = field.to_raw(value)
-            if isinstance(field, fields.Secret):
-                data[f"__{name}"] = raw_value
-            else:
-                data[name] = raw_value
+            if isinstance(field, fields.Object) and getattr(self, f"__{name}", None) is child:
+                self._mark_dirty(name)
 
-        return data
+    def _mark_dirty(self, name):
+        if self.__dirty is not None:
+            self.__dirty.add(name)
 
-    def _set_data(self, new_data):
-        for name, field in self._get_fields().items():
-            if name in new_data:
-                try:
-                    setattr(self, f"__{name}", field.from_raw(new_data[name]))
-                except (fields.ValidationError, ValueError):
-                    # should at least log validation and value errors
-                    # this can happen in case of e.g. fields type change
-                    pass
+    def _mark_clean(self):
+        """mark all fields as not changed, e.g. after loading or saving"""
+        self.__dirty = set()
 
-    def _attr_updated(self, name, value):
-        event = AttributeUpdateEvent(self, name, value)
-        events.notify(event)
+    def _get_dirty_fields(self):
+        """
+        get names of fields changed (set) since this instance was loaded or saved
+
+        note that only setting a field is tracked, in-place changes (e.g. appending to a list) are not.
+
+        Returns:
+            set of str: field names, or None if not known (e.g. the instance was never loaded or saved)
+        """
+        if self.__dirty is None:
+            return None
+        return set(self.__dirty)
+
+    def _take_dirty_fields(self):
+        """
+        get names of changed fields (see `_get_dirty_fields`) and mark all fields as not changed at once,
+        before getting the data to save, so fields set meanwhile (e.g. while saving in another thread) stay changed
+
+        Returns:
+            set of str: field names, or None if not known
+        """
+        dirty, self.__dirty = self.__dirty, set()
+        return dirty
+
+    def _restore_dirty_fields(self, names):
+        """
+        mark fields taken by `_take_dirty_fields` as changed again, e.g. if saving them failed
+
+        Args:
+            names (set of str): field names, or None if not known
+        """
+        if names is None or self.__dirty is None:
+            self.__dirty = None
+        else:
+            self.__dirty.update(names)
+
+    @contextmanager
+    def batch(self):
+        """
+        defer actions done on attribute updates (e.g. saving by stored factories) until the end of the block,
+        then do them only once.
+
+        ```python
+        with instance.batch():
+            instance.hostname = "10.0.0.5"
+            instance.port = 6380
+        # saved once here
+        ```
+        """
+        self.__batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.__batch_depth -= 1
+            if not self.__batch_depth:
+                deferred, self.__deferred = self.__deferred, {}
+                for fun in deferred.values():
+                    fun(self)
+
+    def _is_batching(self):
+        return self.__batch_depth > 0
+
+    def _defer(self, fun):
+        """
+        call `fun` with this instance at the end of current batch, the same function is called once
+
+        Args:
+            fun (callable): function that takes the instance
+        """
+        self.__deferred[fun] = fun
 
     def validate(self):
+        """validate all fields, or only changed fields if they are known (see `_get_dirty_fields`)"""
+        dirty_fields = self.__dirty
         for name, field in self._get_fields().items():
+            if dirty_fields is not None and name not in dirty_fields:
+                continue
+
+            value = getattr(self, f"__{name}", None)
+            if isinstance(value, EncryptedValue) and not value.decrypted:
+                # already validated before it was stored
+                continue
             field.validate(getattr(self, name))
 
     @property
@@ -150,4 +575,8 @@ class Base(SimpleNamespace, metaclass=BaseMeta):
     def _set_instance_name(self, name):
         self.__instance_name = name
 
-    to_dict = _get_data
+    def _get_factory(self):
+        return self.__factory
+
+    def _set_factory(self, factory):
+        self.__factory = factory
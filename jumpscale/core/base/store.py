@@ -2,21 +2,39 @@
 store defines the interface for the backend storage, let it be filesystem or redis.
 this module also defines the abstractions needed for Encryption modes and different types of stores.
 
+Store instances are shared per store type and `Location` (see `get_store`), all redis stores share
+one connection pool per (hostname, port) and sqlite stores share one connection per (path, thread),
+they are dropped when the configuration changes,
+or explicitly using `invalidate_stores` (e.g. after changing the private key file).
 
 """
 
 
+import fcntl
 import os
 import shutil
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 
 import redis
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from enum import Enum
+from functools import lru_cache
+
+from nacl.encoding import RawEncoder
+from nacl.hash import blake2b
+from nacl.public import Box, PublicKey
+from nacl.secret import SecretBox
+from nacl.utils import random
 
+from jumpscale.core import events
 from jumpscale.data.nacl import NACL
 from jumpscale.data.serializers import base64, json
-from jumpscale.core.config import Environment
+from jumpscale.core.config import Environment, ConfigChangedEvent
 from jumpscale.sals.fs import read_file_binary, write_file_binary, rmtree
 
 
@@ -47,6 +65,12 @@ class Location:
     def from_type(cls, type_):
         return cls(type_.__module__, type_.__name__)
 
+    def __eq__(self, other):
+        return isinstance(other, Location) and self.name_list == other.name_list
+
+    def __hash__(self):
+        return hash(tuple(self.name_list))
+
     def __str__(self):
         args = "', '".join(self.name_list)
         cls_name = self.__class__.__name__
@@ -55,6 +79,12 @@ class Location:
     __repr__ = __str__
 
 
+# prefix of values encrypted using `SecretBox`, ":" is not a base64 character,
+# so values encrypted before (using `Box`) are still recognized
+SECRET_VALUE_TAG = "s1:"
+SYMMETRIC_KEY_CONTEXT = b"jumpscale.core.base.store:secret-fields"
+
+
 class EncryptionMode(Enum):
     """Encryption mode used to configure storing mode for full blown stores.
     """
@@ -63,7 +93,38 @@ class EncryptionMode(Enum):
     Decrypt = 1
 
 
+def derive_symmetric_key(private_key):
+    """derive the key used for symmetric encryption of secret fields from the private key
+
+    Args:
+        private_key (bytes): private key
+
+    Returns:
+        bytes: 32 bytes key
+    """
+    return blake2b(SYMMETRIC_KEY_CONTEXT, key=private_key, digest_size=SecretBox.KEY_SIZE, encoder=RawEncoder)
+
+
+@lru_cache(maxsize=None)
+def get_secret_box(private_key):
+    """get a `SecretBox` using a key derived from the private key, it's created only once per private key
+
+    Args:
+        private_key (bytes): private key
+
+    Returns:
+        nacl.secret.SecretBox: secret box
+    """
+    return SecretBox(derive_symmetric_key(private_key))
+
+
 class EncryptionMixin:
+    """
+    secret values are encrypted using a `SecretBox` with a key derived from the private key (see `get_secret_box`).
+
+    values encrypted before using public key encryption (`Box`) can still be decrypted using `decrypt_legacy`.
+    """
+
     def encrypt(self, data):
         """encrypt data
 
@@ -73,9 +134,25 @@ class EncryptionMixin:
         Returns:
             bytes: encrypted data as byte string
         """
-        if not isinstance(data, bytes):
-            data = data.encode()
-        return self.nacl.encrypt(data, self.public_key)
+        return self.encrypt_many([data])[0]
+
+    def encrypt_many(self, values):
+        """encrypt many values at once, nonces of all values are generated in one call
+
+        Args:
+            values (list of str): input strings
+
+        Returns:
+            list of bytes: encrypted values as byte strings
+        """
+        nonces = random(SecretBox.NONCE_SIZE * len(values))
+        encrypted = []
+        for i, data in enumerate(values):
+            if not isinstance(data, bytes):
+                data = data.encode()
+            nonce = nonces[i * SecretBox.NONCE_SIZE : (i + 1) * SecretBox.NONCE_SIZE]
+            encrypted.append(self.secret_box.encrypt(data, nonce))
+        return encrypted
 
     def decrypt(self, data):
         """decrypt data
@@ -86,11 +163,66 @@ class EncryptionMixin:
         Returns:
             str: decrypted data
         """
-        return self.nacl.decrypt(data, self.public_key).decode()
+        return self.secret_box.decrypt(data).decode()
+
+    def decrypt_legacy(self, data):
+        """decrypt data encrypted using public key encryption
+
+        Args:
+            data (bytes): encrypted byte string
+
+        Returns:
+            str: decrypted data
+        """
+        if self._legacy_box is None:
+            # computing the shared key is expensive, do it only once
+            self._legacy_box = Box(self.nacl.private_key, PublicKey(self.public_key))
+        return self._legacy_box.decrypt(data).decode()
+
+
+class EncryptedValue:
+    """
+    a secret value as loaded from the store, it's decrypted only when `get` is called for the first time,
+    then the decrypted value is cached.
+
+    saving it again to a store will write the same ciphertext.
+    """
+
+    __slots__ = ("ciphertext", "_store", "_value")
+
+    def __init__(self, ciphertext, store):
+        """
+        Args:
+            ciphertext (str): encrypted value as stored
+            store (EncryptedConfigStore): the store used to decrypt it
+        """
+        self.ciphertext = ciphertext
+        self._store = store
+        self._value = None
+
+    @property
+    def decrypted(self):
+        return self._store is None
+
+    def get(self):
+        """
+        get the decrypted value
+
+        Returns:
+            str: decrypted value
+        """
+        if self._store is not None:
+            self._value = self._store._decrypt_value(self.ciphertext)
+            self._store = None
+        return self._value
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(decrypted={self.decrypted})"
 
 
 class ConfigStore(ABC):
-    """the interface every config store should implement which is read, write, list_all, delete."""
+    """the interface every config store should implement which is read, write, list_all, delete
+    and the secondary field index methods."""
 
     @abstractmethod
     def read(self, instance_name):
@@ -108,6 +240,121 @@ class ConfigStore(ABC):
     def delete(self, instance_name):
         pass
 
+    def read_many(self, instance_names):
+        """read many instances at once, stores can override it to do it in bulk
+
+        Args:
+            instance_names (list of str): instance names
+
+        Returns:
+            dict: instance name -> data, instances that do not exist are skipped
+        """
+        data = {}
+        for name in instance_names:
+            value = self.read(name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    def write_many(self, items):
+        """write many instances at once, stores can override it to do it in bulk (e.g. in one transaction)
+
+        Args:
+            items (dict): instance name -> data
+        """
+        for name, data in items.items():
+            self.write(name, data)
+
+    def update(self, instance_name, data):
+        """update some (top-level) keys of stored data, stores that support partial writes should override it
+
+        by default, current data is read and written again with the new values.
+
+        Args:
+            instance_name (str): instance name
+            data (dict): key -> raw value
+        """
+        current = self.read(instance_name)
+        config = json.loads(current) if current else {}
+        config.update(data)
+        return self.write(instance_name, json.dumps(config))
+
+    @abstractmethod
+    def update_field_index(self, instance_name, values):
+        """
+        update secondary indexes of fields for an instance
+
+        Args:
+            instance_name (str): instance name
+            values (dict): field name -> raw value (str, int, float or bool), None values are removed from the index
+        """
+
+    def update_field_index_many(self, items):
+        """
+        update secondary indexes of fields for many instances, stores can override it to do it in bulk
+
+        Args:
+            items (dict): instance name -> values (field name -> raw value), see `update_field_index`
+        """
+        for instance_name, values in items.items():
+            self.update_field_index(instance_name, values)
+
+    @abstractmethod
+    def remove_from_field_index(self, instance_name, field_names):
+        """
+        remove an instance from secondary indexes of given fields
+
+        Args:
+            instance_name (str): instance name
+            field_names (list of str): field names
+        """
+
+    @abstractmethod
+    def find_in_field_index(self, field_name, value):
+        """
+        find instances with a field equal to a raw value
+
+        Args:
+            field_name (str): field name
+            value (str or int or float or bool): raw value
+
+        Returns:
+            set of str: instance names
+        """
+
+    @abstractmethod
+    def find_in_field_range(self, field_name, min=None, max=None):
+        """
+        find instances with a numeric field in a range (inclusive)
+
+        Args:
+            field_name (str): field name
+            min (int or float, optional): minimum value. Defaults to None (no minimum).
+            max (int or float, optional): maximum value. Defaults to None (no maximum).
+
+        Returns:
+            set of str: instance names
+        """
+
+    @abstractmethod
+    def clear_field_index(self, field_names):
+        """
+        remove all secondary indexes of given fields
+
+        Args:
+            field_names (list of str): field names
+        """
+
+
+def is_numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def in_range(value, min=None, max=None):
+    if not is_numeric(value):
+        return False
+    return (min is None or value >= min) and (max is None or value <= max)
+
 
 class EncryptedConfigStore(ConfigStore, EncryptionMixin):
     """secure config storage base"""
@@ -118,37 +365,66 @@ class EncryptedConfigStore(ConfigStore, EncryptionMixin):
         self.priv_key = base64.decode(self.config_env.get_private_key())
         self.nacl = NACL(private_key=self.priv_key)
         self.public_key = self.nacl.public_key.encode()
+        self.secret_box = get_secret_box(self.priv_key)
+        self._legacy_box = None
 
         if not self.priv_key:
             raise InvalidPrivateKey
 
+    def _encrypt_values(self, values):
+        return [SECRET_VALUE_TAG + base64.encode(data).decode("ascii") for data in self.encrypt_many(values)]
+
     def _encrypt_value(self, value):
-        return base64.encode(self.encrypt(value)).decode("ascii")
+        return self._encrypt_values([value])[0]
 
     def _decrypt_value(self, value):
-        return self.decrypt(base64.decode(value))
-
-    def _process_config(self, config, mode):
-        """return the config encrypted or decrypted
+        if value.startswith(SECRET_VALUE_TAG):
+            return self.decrypt(base64.decode(value[len(SECRET_VALUE_TAG) :]))
+        return self.decrypt_legacy(base64.decode(value))
 
-        Args:
-            config (dict): config dict (can be nested)
-            mode (EncryptionMode)
-        """
+    def _collect_config(self, config, mode, secrets, lazy):
         new_config = {}
         for name, value in config.items():
             if name.startswith("__") and value is not None:
                 if mode == EncryptionMode.Decrypt:
-                    new_config[name.lstrip("__")] = self._decrypt_value(value)
-                else:
-                    # preserve __ to know it's an encrypted value
-                    new_config[name] = self._encrypt_value(value)
+                    name = name.lstrip("__")
+                    if lazy:
+                        new_config[name] = EncryptedValue(value, self)
+                        continue
+                elif isinstance(value, EncryptedValue):
+                    # never decrypted, or decrypted but not changed
+                    new_config[name] = value.ciphertext
+                    continue
+                # value is set after all secrets are processed, preserve __ to know it's an encrypted value
+                secrets.append((new_config, name, value))
             elif isinstance(value, dict):
-                new_config[name] = self._process_config(value, mode)
+                new_config[name] = self._collect_config(value, mode, secrets, lazy)
             else:
                 new_config[name] = value
         return new_config
 
+    def _process_config(self, config, mode, lazy=False):
+        """return the config encrypted or decrypted, all secret values are encrypted at once
+
+        Args:
+            config (dict): config dict (can be nested)
+            mode (EncryptionMode)
+            lazy (bool, optional): in decrypt mode, get secret values as `EncryptedValue` objects
+                                   to be decrypted when needed. Defaults to False.
+        """
+        secrets = []
+        new_config = self._collect_config(config, mode, secrets, lazy)
+        if secrets:
+            values = [value for _, _, value in secrets]
+            if mode == EncryptionMode.Decrypt:
+                values = [self._decrypt_value(value) for value in values]
+            else:
+                values = self._encrypt_values(values)
+
+            for (target, name, _), value in zip(secrets, values):
+                target[name] = value
+        return new_config
+
     def get(self, instance_name):
         """get instance config
 
@@ -161,8 +437,24 @@ class EncryptedConfigStore(ConfigStore, EncryptionMixin):
         config = json.loads(self.read(instance_name))
         return self._process_config(config, EncryptionMode.Decrypt)
 
+    def get_many(self, instance_names, lazy=False):
+        """get many instance configs at once, using `read_many` of this store
+
+        Args:
+            instance_names (list of str): instance names
+            lazy (bool, optional): get secret values as `EncryptedValue` objects, to be decrypted on access.
+                                   Defaults to False.
+
+        Returns:
+            dict: instance name -> config dict, instances that do not exist are skipped
+        """
+        return {
+            name: self._process_config(json.loads(data), EncryptionMode.Decrypt, lazy=lazy)
+            for name, data in self.read_many(instance_names).items()
+        }
+
     def get_all(self):
-        return {name: self.get(name) for name in self.list_all()}
+        return self.get_many(self.list_all())
 
     def save(self, instance_name, config):
         """save instance config
@@ -170,6 +462,7 @@ class EncryptedConfigStore(ConfigStore, EncryptionMixin):
         Args:
             instance_name (str): name of instnace
             config (dict): config data, any key that starts with `__` will be encrypted
+                (`EncryptedValue` objects are written as is)
 
         Returns:
             bool: written or not
@@ -177,16 +470,44 @@ class EncryptedConfigStore(ConfigStore, EncryptionMixin):
         new_config = self._process_config(config, EncryptionMode.Encrypt)
         return self.write(instance_name, json.dumps(new_config))
 
+    def save_partial(self, instance_name, config):
+        """save only some keys of instance config, using `update` of this store
+
+        Args:
+            instance_name (str): name of instnace
+            config (dict): changed config data, any key that starts with `__` will be encrypted
+        """
+        new_config = self._process_config(config, EncryptionMode.Encrypt)
+        return self.update(instance_name, new_config)
+
+    def save_many(self, configs):
+        """save many instance configs at once, using `write_many` of this store
+
+        Args:
+            configs (dict): instance name -> config dict
+        """
+        self.write_many(
+            {name: json.dumps(self._process_config(config, EncryptionMode.Encrypt)) for name, config in configs.items()}
+        )
+
 
 class FileSystemStore(EncryptedConfigStore):
     """Filesystem store is an EncryptedConfigStore
     It saves the config relative to `config_env.get_store_config("filesystem")`
 
+    Secondary indexes of fields are kept in one index file per location (`.index`),
+    it's updated while holding a lock on `.index.lock`, so concurrent processes do not lose each other's updates.
     """
 
+    MIN_PARALLEL_READS = 8
+    MAX_READ_WORKERS = 16
+
     def __init__(self, location):
         super(FileSystemStore, self).__init__(location)
         self.root = self.config_env.get_store_config("filesystem")["path"]
+        self._field_index = None
+        self._field_index_mtime = None
+        self._field_index_lock = threading.Lock()
 
     @property
     def config_root(self):
@@ -207,16 +528,122 @@ class FileSystemStore(EncryptedConfigStore):
         path = self.get_path(instance_name)
         return read_file_binary(path)
 
+    def read_many(self, instance_names):
+        """read many instances using a thread pool, as most of the time is spent waiting for the filesystem
+
+        Args:
+            instance_names (list of str): instance names
+
+        Returns:
+            dict: instance name -> data, instances that do not exist are skipped
+        """
+        instance_names = list(instance_names)
+
+        def read(name):
+            try:
+                return self.read(name)
+            except FileNotFoundError:
+                return None
+
+        if len(instance_names) < self.MIN_PARALLEL_READS:
+            values = map(read, instance_names)
+            return {name: value for name, value in zip(instance_names, values) if value is not None}
+
+        with ThreadPoolExecutor(max_workers=self.MAX_READ_WORKERS) as executor:
+            values = executor.map(read, instance_names)
+            return {name: value for name, value in zip(instance_names, values) if value is not None}
+
     def list_all(self):
         if not os.path.exists(self.config_root):
             return []
-        return os.listdir(self.config_root)
+        # skip hidden files, e.g. the index file
+        return [name for name in os.listdir(self.config_root) if not name.startswith(".")]
 
     def write(self, instance_name, data):
         path = self.get_path(instance_name)
         self.make_path(path)
         return write_file_binary(path, data.encode())
 
+    @property
+    def index_path(self):
+        return os.path.join(self.config_root, ".index")
+
+    @property
+    def index_lock_path(self):
+        return os.path.join(self.config_root, ".index.lock")
+
+    @contextmanager
+    def _lock_field_index(self):
+        """
+        lock the index file of this location for an update (read, modify then replace),
+        by other threads and processes
+        """
+        with self._field_index_lock:
+            os.makedirs(self.config_root, exist_ok=True)
+            with open(self.index_lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_field_index(self, reload=False):
+        """
+        read the index file, it's a json object of field name -> {instance name -> raw value}
+
+        Args:
+            reload (bool, optional): read it even if it seems not changed. Defaults to False.
+
+        Returns:
+            dict: field index
+        """
+        path = self.index_path
+        mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        if reload or self._field_index is None or mtime != self._field_index_mtime:
+            self._field_index = json.loads(read_file_binary(path)) if mtime else {}
+            self._field_index_mtime = mtime
+        return self._field_index
+
+    def _write_field_index(self, index):
+        os.makedirs(self.config_root, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        write_file_binary(tmp_path, json.dumps(index).encode())
+        os.replace(tmp_path, self.index_path)
+
+    def update_field_index(self, instance_name, values):
+        self.update_field_index_many({instance_name: values})
+
+    def update_field_index_many(self, items):
+        with self._lock_field_index():
+            # the mtime may not change if another process replaced it in the same tick
+            index = self._read_field_index(reload=True)
+            for instance_name, values in items.items():
+                for field_name, value in values.items():
+                    field_index = index.setdefault(field_name, {})
+                    if value is None:
+                        field_index.pop(instance_name, None)
+                    else:
+                        field_index[instance_name] = value
+            self._write_field_index(index)
+
+    def remove_from_field_index(self, instance_name, field_names):
+        self.update_field_index(instance_name, dict.fromkeys(field_names))
+
+    def find_in_field_index(self, field_name, value):
+        field_index = self._read_field_index().get(field_name, {})
+        return {name for name, indexed_value in field_index.items() if indexed_value == value}
+
+    def find_in_field_range(self, field_name, min=None, max=None):
+        field_index = self._read_field_index().get(field_name, {})
+        return {name for name, indexed_value in field_index.items() if in_range(indexed_value, min, max)}
+
+    def clear_field_index(self, field_names):
+        with self._lock_field_index():
+            index = self._read_field_index(reload=True)
+            for field_name in field_names:
+                index.pop(field_name, None)
+            self._write_field_index(index)
+
     def delete(self, instance_name):
         path = self.get_instance_root(instance_name)
         if os.path.exists(path):
@@ -226,37 +653,666 @@ class FileSystemStore(EncryptedConfigStore):
 class RedisStore(EncryptedConfigStore):
     """RedisStore store is an EncryptedConfigStore
     It saves the data in redis and configuration for redis comes from `config_env.get_store_config("redis")`
+
+    Every instance is stored as a hash of field -> json value, so only changed fields are written on updates
+    (see `update`), instances stored before as one json string are still supported.
+
+    Every location keeps a set of its instance names (see `get_names_key`), updated atomically with writes and deletes,
+    so listing does not need to go through the whole keyspace.
+
+    Every location is also registered in a set of each of its parent name prefixes (see `get_locations_key`),
+    so deleting an instance finds the locations of its sub-factories without going through the whole keyspace.
+
+    For data written before these sets existed, they're built once using `SCAN` (see `build_index`).
+
+    Secondary indexes of fields are kept as a set of instance names per value,
+    a sorted set for numeric values (for range lookups) and a hash of instance name -> value (to update them).
     """
 
+    MGET_BATCH_SIZE = 1000
+
     def __init__(self, location):
         super().__init__(location)
         redis_config = self.config_env.get_store_config("redis")
-        self.redis_client = redis.Redis(redis_config["hostname"], redis_config["port"])
+        pool = get_redis_connection_pool(redis_config["hostname"], redis_config["port"])
+        self.redis_client = redis.Redis(connection_pool=pool)
+        self._index_checked = False
 
     def get_key(self, instance_name):
         return ".".join([self.location.name, instance_name])
 
+    def get_names_key(self):
+        # ":" cannot be a part of instance or location names, so it will never conflict with instance keys
+        return f"{self.location.name}:names"
+
+    def get_indexed_key(self):
+        return f"{self.location.name}:indexed"
+
+    def get_locations_key(self, prefix=None):
+        # all locations starting with `prefix.`, e.g. locations of sub-factories of an instance
+        return f"{prefix or self.location.name}:locations"
+
+    def get_fields_key(self):
+        return f"{self.location.name}:fields"
+
+    def _register_location(self, pipeline, location_name_list=None):
+        """register a location in the locations set of every of its parent name prefixes
+
+        Args:
+            pipeline (redis.client.Pipeline): pipeline
+            location_name_list (list of str, optional): location name list. Defaults to this store location.
+        """
+        name_list = location_name_list or self.location.name_list
+        location_name = ".".join(name_list)
+        for i in range(1, len(name_list)):
+            pipeline.sadd(self.get_locations_key(".".join(name_list[:i])), location_name)
+
+    def build_index(self):
+        """build the instance names, locations and indexed fields sets of this location
+        and all of its sub-locations from existing keys using cursor based `SCAN`
+        """
+        prefix = f"{self.location.name}."
+        names = {self.location.name: set()}
+        fields = {}
+        for key in self.redis_client.scan_iter(match=f"{prefix}*", count=1000):
+            key = key.decode()
+            if ":" in key:
+                # metadata key of a sub-location, e.g. "<location>:names" or "<location>:index:<field>"
+                location_name, _, rest = key.partition(":")
+                names.setdefault(location_name, set())
+                kind, _, field_name = rest.partition(":")
+                if kind in ("index", "range"):
+                    fields.setdefault(location_name, set()).add(field_name.partition(":")[0])
+            else:
+                # instance names and location names never contain dots
+                location_name, _, name = key.rpartition(".")
+                names.setdefault(location_name, set()).add(name)
+        pipeline = self.redis_client.pipeline()
+        for location_name, location_names in names.items():
+            if location_name != self.location.name:
+                self._register_location(pipeline, location_name.split("."))
+            if location_names:
+                pipeline.sadd(f"{location_name}:names", *location_names)
+            if fields.get(location_name):
+                pipeline.sadd(f"{location_name}:fields", *fields[location_name])
+            pipeline.set(f"{location_name}:indexed", 1)
+        # registered even if empty, so its marker is deleted with its parent instance
+        self._register_location(pipeline)
+        pipeline.execute()
+
+    def _ensure_index(self):
+        if not self._index_checked:
+            if not self.redis_client.exists(self.get_indexed_key()):
+                self.build_index()
+            self._index_checked = True
+
+    def _join_fields(self, fields):
+        # every field is stored as a json value, join them as one json object without decoding them
+        return "{%s}" % ", ".join(f"{json.dumps(name.decode())}: {value.decode()}" for name, value in fields.items())
+
+    def _split_fields(self, data):
+        return {name: json.dumps(value) for name, value in json.loads(data).items()}
+
     def read(self, instance_name):
-        return self.redis_client.get(self.get_key(instance_name))
+        return self.read_many([instance_name]).get(instance_name)
+
+    def read_many(self, instance_names):
+        """read many instances using pipelined `HGETALL`, in batches of `MGET_BATCH_SIZE` keys
+
+        instances written before as one string value are read using `MGET`.
+
+        Args:
+            instance_names (list of str): instance names
+
+        Returns:
+            dict: instance name -> data, instances that do not exist are skipped
+        """
+        instance_names = list(instance_names)
+        data = {}
+        for i in range(0, len(instance_names), self.MGET_BATCH_SIZE):
+            names = instance_names[i : i + self.MGET_BATCH_SIZE]
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for name in names:
+                pipeline.hgetall(self.get_key(name))
+
+            legacy_names = []
+            for name, value in zip(names, pipeline.execute(raise_on_error=False)):
+                if isinstance(value, redis.ResponseError):
+                    # not a hash
+                    legacy_names.append(name)
+                elif value:
+                    data[name] = self._join_fields(value)
+
+            if legacy_names:
+                values = self.redis_client.mget([self.get_key(name) for name in legacy_names])
+                data.update({name: value for name, value in zip(legacy_names, values) if value is not None})
+        return data
+
+    def _get_location_keys(self, location_names):
+        """get all keys of given locations: instances, metadata and secondary indexes
+
+        Args:
+            location_names (list of str): location names
 
-    def get_location_keys(self):
-        return self.redis_client.keys(f"{self.location.name}.*")
+        Returns:
+            list of str: keys
+        """
+        location_names = list(location_names)
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for location_name in location_names:
+            pipeline.smembers(f"{location_name}:names")
+            pipeline.smembers(f"{location_name}:fields")
+        results = pipeline.execute()
+
+        keys = []
+        index_keys = []
+        for i, location_name in enumerate(location_names):
+            names, field_names = results[2 * i], results[2 * i + 1]
+            keys += [f"{location_name}.{name.decode()}" for name in names]
+            keys += [f"{location_name}:{kind}" for kind in ("names", "indexed", "fields", "locations")]
+            for field_name in field_names:
+                index_key = f"{location_name}:index:{field_name.decode()}"
+                index_keys.append(index_key)
+                keys += [index_key, f"{location_name}:range:{field_name.decode()}"]
+
+        # value sets of secondary indexes, values are stored as json already
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for index_key in index_keys:
+            pipeline.hvals(index_key)
+        for index_key, values in zip(index_keys, pipeline.execute()):
+            keys += {f"{index_key}:{value.decode()}" for value in values}
+        return keys
+
+    def get_sub_locations(self, instance_name):
+        """get names of sub-locations of an instance (e.g. locations of stored factories of this instance)
 
-    def get_instance_keys(self, instance_name):
-        return self.redis_client.keys(f"{self.location.name}.{instance_name}*")
+        Args:
+            instance_name (str): instance name
+
+        Returns:
+            list of str: location names
+        """
+        locations = self.redis_client.smembers(self.get_locations_key(self.get_key(instance_name)))
+        return [location.decode() for location in locations]
+
+    def get_instance_keys(self, instance_name, sub_locations=None):
+        """get the key of this instance and keys of its sub-locations (e.g. stored factories of this instance)
+
+        Args:
+            instance_name (str): instance name
+            sub_locations (list of str, optional): sub-locations, if already known. Defaults to None.
+
+        Returns:
+            list of str: keys
+        """
+        key = self.get_key(instance_name)
+        if sub_locations is None:
+            sub_locations = self.get_sub_locations(instance_name)
+
+        # locations sets of the prefixes between this instance and its sub-locations
+        prefixes = {key}
+        for location_name in sub_locations:
+            parts = location_name.split(".")
+            for i in range(len(self.location.name_list) + 2, len(parts)):
+                prefixes.add(".".join(parts[:i]))
+        return [key] + [self.get_locations_key(prefix) for prefix in prefixes] + self._get_location_keys(sub_locations)
 
     def list_all(self):
-        names = []
+        self._ensure_index()
+        return [name.decode() for name in self.redis_client.smembers(self.get_names_key())]
 
-        keys = self.get_location_keys()
-        for key in keys:
-            name = key.decode().replace(self.location.name, "").lstrip(".")
-            if "." not in name:
-                names.append(name)
-        return names
+    def write(self, instance_name, data):
+        self.write_many({instance_name: data})
+        return True
+
+    def write_many(self, items):
+        """write many instances in one transaction, every instance is a hash of field -> json value
+
+        Args:
+            items (dict): instance name -> data
+        """
+        self._ensure_index()
+        pipeline = self.redis_client.pipeline()
+        for name, data in items.items():
+            key = self.get_key(name)
+            fields = self._split_fields(data)
+            pipeline.delete(key)
+            if fields:
+                hset_many(pipeline, key, fields)
+            else:
+                # a hash cannot be empty
+                pipeline.set(key, data)
+        if items:
+            pipeline.sadd(self.get_names_key(), *items.keys())
+            # the location can be deleted with a parent instance by another store, so always register it again
+            pipeline.set(self.get_indexed_key(), 1)
+            self._register_location(pipeline)
+        pipeline.execute()
+
+    def update(self, instance_name, data):
+        """update only given hash fields of an instance
+
+        Args:
+            instance_name (str): instance name
+            data (dict): key -> raw value
+        """
+        key = self.get_key(instance_name)
+        if not data or self.redis_client.type(key) != b"hash":
+            # not stored yet, or stored as one string value before
+            return super().update(instance_name, data)
+
+        pipeline = self.redis_client.pipeline()
+        hset_many(pipeline, key, {name: json.dumps(value) for name, value in data.items()})
+        pipeline.sadd(self.get_names_key(), instance_name)
+        pipeline.execute()
+
+    def delete(self, instance_name):
+        self._ensure_index()
+        sub_locations = self.get_sub_locations(instance_name)
+
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(*self.get_instance_keys(instance_name, sub_locations))
+        pipeline.srem(self.get_names_key(), instance_name)
+        if sub_locations:
+            # unregister sub-locations from the parent prefixes of this instance
+            for i in range(1, len(self.location.name_list) + 1):
+                pipeline.srem(self.get_locations_key(".".join(self.location.name_list[:i])), *sub_locations)
+        return pipeline.execute()[0]
+
+    def get_field_index_key(self, field_name):
+        return f"{self.location.name}:index:{field_name}"
+
+    def get_field_value_key(self, field_name, value):
+        # values are encoded as json, so e.g. 1 and "1" are different
+        return f"{self.get_field_index_key(field_name)}:{json.dumps(value)}"
+
+    def get_field_range_key(self, field_name):
+        return f"{self.location.name}:range:{field_name}"
+
+    def update_field_index(self, instance_name, values):
+        field_names = list(values.keys())
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for field_name in field_names:
+            pipeline.hget(self.get_field_index_key(field_name), instance_name)
+        old_values = pipeline.execute()
+
+        pipeline = self.redis_client.pipeline()
+        if field_names:
+            pipeline.sadd(self.get_fields_key(), *field_names)
+        for field_name, old_value in zip(field_names, old_values):
+            value = values[field_name]
+            if old_value is not None:
+                pipeline.srem(self.get_field_value_key(field_name, json.loads(old_value)), instance_name)
+
+            if value is None:
+                pipeline.hdel(self.get_field_index_key(field_name), instance_name)
+            else:
+                pipeline.hset(self.get_field_index_key(field_name), instance_name, json.dumps(value))
+                pipeline.sadd(self.get_field_value_key(field_name, value), instance_name)
+
+            if is_numeric(value):
+                pipeline.zadd(self.get_field_range_key(field_name), {instance_name: value})
+            else:
+                pipeline.zrem(self.get_field_range_key(field_name), instance_name)
+        pipeline.execute()
+
+    def remove_from_field_index(self, instance_name, field_names):
+        self.update_field_index(instance_name, dict.fromkeys(field_names))
+
+    def find_in_field_index(self, field_name, value):
+        return {name.decode() for name in self.redis_client.smembers(self.get_field_value_key(field_name, value))}
+
+    def find_in_field_range(self, field_name, min=None, max=None):
+        min = "-inf" if min is None else min
+        max = "+inf" if max is None else max
+        names = self.redis_client.zrangebyscore(self.get_field_range_key(field_name), min, max)
+        return {name.decode() for name in names}
+
+    def clear_field_index(self, field_names):
+        field_names = list(field_names)
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for field_name in field_names:
+            pipeline.hvals(self.get_field_index_key(field_name))
+
+        keys = []
+        for field_name, values in zip(field_names, pipeline.execute()):
+            keys.append(self.get_field_index_key(field_name))
+            keys.append(self.get_field_range_key(field_name))
+            # values are stored as json already
+            keys += {f"{self.get_field_index_key(field_name)}:{value.decode()}" for value in values}
+        if keys:
+            self.redis_client.delete(*keys)
+
+
+class SQLiteStore(EncryptedConfigStore):
+    """SQLiteStore store is an EncryptedConfigStore
+    It saves the data of all locations in one sqlite database (in WAL mode),
+    the database path comes from `config_env.get_store_config("sqlite")`
+
+    Every (location, name) is a row in `configs` table, secondary indexes of fields are rows in `field_index` table.
+    Only changed keys are written on updates (see `update`).
+    """
+
+    READ_BATCH_SIZE = 500
+
+    def __init__(self, location):
+        super().__init__(location)
+        self.path = self.config_env.get_store_config("sqlite")["path"]
+
+    @property
+    def connection(self):
+        return get_sqlite_connection(self.path, SQLITE_SCHEMA)
+
+    def get_child_prefix(self, instance_name):
+        # locations of sub-factories of this instance start with this prefix
+        return f"{self.location.name}.{instance_name}."
+
+    def read(self, instance_name):
+        row = self.connection.execute(
+            "SELECT data FROM configs WHERE location = ? AND name = ?", (self.location.name, instance_name)
+        ).fetchone()
+        if row:
+            return row[0]
+
+    def read_many(self, instance_names):
+        """read many instances using `IN` queries, in batches of `READ_BATCH_SIZE` names
+
+        Args:
+            instance_names (list of str): instance names
+
+        Returns:
+            dict: instance name -> data, instances that do not exist are skipped
+        """
+        instance_names = list(instance_names)
+        data = {}
+        for i in range(0, len(instance_names), self.READ_BATCH_SIZE):
+            names = instance_names[i : i + self.READ_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(names))
+            rows = self.connection.execute(
+                f"SELECT name, data FROM configs WHERE location = ? AND name IN ({placeholders})",
+                [self.location.name, *names],
+            )
+            data.update(rows)
+        return data
+
+    def list_all(self):
+        rows = self.connection.execute("SELECT name FROM configs WHERE location = ?", (self.location.name,))
+        return [row[0] for row in rows]
 
     def write(self, instance_name, data):
-        return self.redis_client.set(self.get_key(instance_name), data)
+        self.write_many({instance_name: data})
+        return True
+
+    def write_many(self, items):
+        """write many instances in one transaction
+
+        Args:
+            items (dict): instance name -> data
+        """
+        with self.connection as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO configs (location, name, data) VALUES (?, ?, ?)",
+                [(self.location.name, name, data) for name, data in items.items()],
+            )
+
+    def update(self, instance_name, data):
+        """update only given keys of an instance using `json_set`
+
+        Args:
+            instance_name (str): instance name
+            data (dict): key -> raw value
+        """
+        if not data:
+            return
+
+        params = []
+        for name, value in data.items():
+            params += [f'$."{name}"', json.dumps(value)]
+        paths = ", ".join(["?, json(?)"] * len(data))
+
+        with self.connection as connection:
+            cursor = connection.execute(
+                f"UPDATE configs SET data = json_set(data, {paths}) WHERE location = ? AND name = ?",
+                params + [self.location.name, instance_name],
+            )
+            if not cursor.rowcount:
+                connection.execute(
+                    "INSERT INTO configs (location, name, data) VALUES (?, ?, ?)",
+                    (self.location.name, instance_name, json.dumps(data)),
+                )
 
     def delete(self, instance_name):
-        return self.redis_client.delete(*self.get_instance_keys(instance_name))
+        prefix = self.get_child_prefix(instance_name)
+        # a range of locations can use the indexes, all locations starting with the prefix are in it
+        # ("/" comes right after "." in collation order)
+        end = prefix[:-1] + "/"
+        with self.connection as connection:
+            for table in ("configs", "field_index"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE location = ? AND name = ?", (self.location.name, instance_name)
+                )
+                connection.execute(f"DELETE FROM {table} WHERE location >= ? AND location < ?", (prefix, end))
+
+    def update_field_index(self, instance_name, values):
+        self.update_field_index_many({instance_name: values})
+
+    def update_field_index_many(self, items):
+        removed, updated = [], []
+        for instance_name, values in items.items():
+            for field_name, value in values.items():
+                if value is None:
+                    removed.append((self.location.name, field_name, instance_name))
+                else:
+                    number = value if is_numeric(value) else None
+                    updated.append((self.location.name, field_name, instance_name, json.dumps(value), number))
+
+        with self.connection as connection:
+            connection.executemany("DELETE FROM field_index WHERE location = ? AND field = ? AND name = ?", removed)
+            connection.executemany(
+                "INSERT OR REPLACE INTO field_index (location, field, name, value, number) VALUES (?, ?, ?, ?, ?)",
+                updated,
+            )
+
+    def remove_from_field_index(self, instance_name, field_names):
+        self.update_field_index(instance_name, dict.fromkeys(field_names))
+
+    def find_in_field_index(self, field_name, value):
+        rows = self.connection.execute(
+            "SELECT name FROM field_index WHERE location = ? AND field = ? AND value = ?",
+            (self.location.name, field_name, json.dumps(value)),
+        )
+        return {row[0] for row in rows}
+
+    def find_in_field_range(self, field_name, min=None, max=None):
+        query = "SELECT name FROM field_index WHERE location = ? AND field = ? AND number IS NOT NULL"
+        params = [self.location.name, field_name]
+        if min is not None:
+            query += " AND number >= ?"
+            params.append(min)
+        if max is not None:
+            query += " AND number <= ?"
+            params.append(max)
+        return {row[0] for row in self.connection.execute(query, params)}
+
+    def clear_field_index(self, field_names):
+        with self.connection as connection:
+            connection.executemany(
+                "DELETE FROM field_index WHERE location = ? AND field = ?",
+                [(self.location.name, field_name) for field_name in field_names],
+            )
+
+
+_stores = {}
+_redis_pools = {}
+_lock = threading.RLock()
+_sqlite_local = threading.local()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    location TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (location, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS field_index (
+    location TEXT NOT NULL,
+    field TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    number REAL,
+    PRIMARY KEY (location, field, name)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS field_index_value ON field_index (location, field, value);
+CREATE INDEX IF NOT EXISTS field_index_number ON field_index (location, field, number);
+"""
+
+
+def get_redis_connection_pool(hostname, port):
+    """get a connection pool shared by all redis stores using the same hostname and port
+
+    Args:
+        hostname (str): redis hostname
+        port (int): redis port
+
+    Returns:
+        redis.ConnectionPool: connection pool
+    """
+    key = (hostname, port)
+    with _lock:
+        if key not in _redis_pools:
+            _redis_pools[key] = redis.ConnectionPool(host=hostname, port=port)
+        return _redis_pools[key]
+
+
+def hset_many(client, key, mapping):
+    """set many hash fields, one `HSET` per field, as `HSET` with a mapping needs redis-py >= 3.5
+
+    Args:
+        client (redis.Redis or redis.client.Pipeline): client, should be a pipeline to do it in one round trip
+        key (str): hash key
+        mapping (dict): field -> value
+    """
+    for field, value in mapping.items():
+        client.hset(key, field, value)
+
+
+def get_sqlite_connection(path, schema=None):
+    """get a connection to the sqlite database at `path`, shared by all its users in the current thread
+    (e.g. sqlite stores)
+
+    the database is created (in WAL mode) if it does not exist.
+
+    Args:
+        path (str): database path
+        schema (str, optional): sql script to run when connecting, e.g. `SQLITE_SCHEMA`. Defaults to None.
+
+    Returns:
+        sqlite3.Connection: connection
+    """
+    connections = getattr(_sqlite_local, "connections", None)
+    if connections is None:
+        connections = _sqlite_local.connections = {}
+
+    # connections cannot be used across processes, e.g. after a fork
+    key = (os.path.abspath(path), os.getpid())
+    connection = connections.get(key)
+    if connection is None:
+        os.makedirs(os.path.dirname(key[0]), exist_ok=True)
+        connection = sqlite3.connect(key[0])
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if schema:
+            connection.executescript(schema)
+        connections[key] = connection
+    return connection
+
+
+def close_sqlite_connection(path):
+    """close the connection of the current thread to the sqlite database at `path`, if any
+
+    Args:
+        path (str): database path
+    """
+    connections = getattr(_sqlite_local, "connections", {})
+    connection = connections.pop((os.path.abspath(path), os.getpid()), None)
+    if connection is not None:
+        connection.close()
+
+
+def migrate_filesystem_to_sqlite(filesystem_path=None, sqlite_path=None):
+    """copy all instances (and field indexes) from a filesystem store to an sqlite store
+
+    data is copied as is (encrypted), so both stores must be used with the same private key.
+
+    Args:
+        filesystem_path (str, optional): filesystem store path. Defaults to the configured one.
+        sqlite_path (str, optional): sqlite database path. Defaults to the configured one.
+
+    Returns:
+        int: number of copied instances
+    """
+    config_env = Environment()
+    filesystem_path = filesystem_path or config_env.get_store_config("filesystem")["path"]
+    sqlite_path = sqlite_path or config_env.get_store_config("sqlite")["path"]
+
+    configs = []
+    field_index = []
+    for dirpath, _, filenames in os.walk(filesystem_path):
+        parts = os.path.relpath(dirpath, filesystem_path).split(os.sep)
+        if "data" in filenames and len(parts) > 1:
+            location, name = ".".join(parts[:-1]), parts[-1]
+            configs.append((location, name, read_file_binary(os.path.join(dirpath, "data")).decode()))
+        if ".index" in filenames:
+            location = ".".join(parts)
+            index = json.loads(read_file_binary(os.path.join(dirpath, ".index")))
+            for field_name, values in index.items():
+                for name, value in values.items():
+                    number = value if is_numeric(value) else None
+                    field_index.append((location, field_name, name, json.dumps(value), number))
+
+    with get_sqlite_connection(sqlite_path, SQLITE_SCHEMA) as connection:
+        connection.executemany("INSERT OR REPLACE INTO configs (location, name, data) VALUES (?, ?, ?)", configs)
+        connection.executemany(
+            "INSERT OR REPLACE INTO field_index (location, field, name, value, number) VALUES (?, ?, ?, ?, ?)",
+            field_index,
+        )
+    return len(configs)
+
+
+def get_store(store_type, location):
+    """get a shared store instance of `store_type` for this location, it's created only once until invalidated
+
+    Args:
+        store_type (type): store type (class), e.g. `FileSystemStore`
+        location (Location): location
+
+    Returns:
+        ConfigStore: store instance
+    """
+    key = (store_type, location)
+    store = _stores.get(key)
+    if store is None:
+        # not created with `_lock` held, creating a store may need other locks (e.g. the config cache lock),
+        # if more than one is created concurrently, only the first one added is shared
+        store = store_type(location)
+        with _lock:
+            store = _stores.setdefault(key, store)
+    return store
+
+
+def invalidate_stores():
+    """drop all shared store instances, redis connection pools and sqlite connections of the current thread,
+    they will be created again when needed"""
+    with _lock:
+        _stores.clear()
+        # connections still used by old instances are closed when they're garbage collected
+        _redis_pools.clear()
+        _sqlite_local.connections = {}
+
+
+@events.handle(ConfigChangedEvent)
+def on_config_changed(ev):
+    # private key path or stores configurations may have changed
+    invalidate_stores()
@@ -5,9 +5,22 @@ It allows
 - Getting configurations using `get_default_config`
 - Updating configuration using `update_config`
 
+The loaded configuration is cached in memory, and only loaded again if the file changed (checked using its mtime),
+when it's loaded again or updated, a `ConfigChangedEvent` is sent using `jumpscale.core.events`:
+
+```python
+from jumpscale.core import events
+from jumpscale.core.config import ConfigChangedEvent
+
+@events.handle(ConfigChangedEvent)
+def config_changed(ev):
+    print(ev.config["store"])
+```
 """
 
+import copy
 import os
+import threading
 
 import nacl.utils
 import nacl.encoding
@@ -15,8 +28,18 @@ import pytoml as toml
 
 from nacl.public import PrivateKey, Box
 
+from jumpscale.core import events
 
-__all__ = ["config_path", "config_root", "get_default_config", "get_config", "update_config", "Environment"]
+
+__all__ = [
+    "config_path",
+    "config_root",
+    "get_default_config",
+    "get_config",
+    "update_config",
+    "Environment",
+    "ConfigChangedEvent",
+]
 
 
 config_root = os.path.expanduser(os.path.join("~/.config", "jumpscale"))
@@ -40,6 +63,7 @@ def get_default_config():
         "stores": {
             "redis": {"hostname": "localhost", "port": 6379},
             "filesystem": {"path": os.path.expanduser(os.path.join(config_root, "secureconfig"))},
+            "sqlite": {"path": os.path.expanduser(os.path.join(config_root, "secureconfig.db"))},
         },
         "store": "filesystem",
        }```
@@ -67,29 +91,104 @@ def get_default_config():
         "stores": {
             "redis": {"hostname": "localhost", "port": 6379},
             "filesystem": {"path": os.path.expanduser(os.path.join(config_root, "secureconfig"))},
+            "sqlite": {"path": os.path.expanduser(os.path.join(config_root, "secureconfig.db"))},
         },
         "store": "filesystem",
     }
 
 
+class ConfigChangedEvent:
+    def __init__(self, config):
+        """
+        sent when the configuration is updated or changed on disk (and loaded again)
+
+        Args:
+            config (dict): new configuration
+        """
+        self.config = config
+
+
+_cache_lock = threading.RLock()
+_cached_config = None
+_cached_signature = None
+
+
+def _get_signature():
+    # inode changes too when the file is replaced (see `update_config`)
+    stat = os.stat(config_path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _set_cached_config(config, signature):
+    """set the cached config, must be called with `_cache_lock` held
+
+    Returns:
+        bool: whether a previously loaded config was changed, `_notify_changed` should be called then
+        (after releasing `_cache_lock`, handlers may take other locks)
+    """
+    global _cached_config, _cached_signature
+
+    changed = _cached_config is not None
+    _cached_config, _cached_signature = config, signature
+    return changed
+
+
+def _notify_changed(config):
+    events.notify(ConfigChangedEvent(copy.deepcopy(config)))
+
+
+def _get_cached_config():
+    """get the cached configurations, load them only if the config file changed
+
+    the returned dict is shared, it must not be modified, use `get_config` to get a copy
+
+    Returns:
+        dict: configurations
+    """
+    changed = False
+    with _cache_lock:
+        # get the signature before reading, if the file is changed while reading, it will be loaded again next time
+        signature = _get_signature()
+        if signature != _cached_signature:
+            with open(config_path, "r") as f:
+                changed = _set_cached_config(toml.load(f), signature)
+        config = _cached_config
+
+    if changed:
+        _notify_changed(config)
+    return config
+
+
 def get_config():
     """Gets jumpscale configurations
 
     Returns:
         [dict] - toml loaded config of CONFIG_DIR/config.toml
     """
-    with open(config_path, "r") as f:
-        return toml.load(f)
+    return copy.deepcopy(_get_cached_config())
 
 
 def update_config(data):
     """Update jumpscale config with new data
 
+    The new config is written to a temporary file first, then renamed to `config_path`,
+    so readers never see a partially written config.
+
     Arguments:
         data {dict} -- dict to update the config with.
     """
-    with open(config_path, "w") as f:
-        toml.dump(data, f)
+    with _cache_lock:
+        tmp_path = f"{config_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            toml.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, config_path)
+        config = copy.deepcopy(data)
+        changed = _set_cached_config(config, _get_signature())
+
+    if changed:
+        _notify_changed(config)
 
 
 def migrate_config():
@@ -99,14 +198,18 @@ def migrate_config():
     current_config = get_config()
 
     def copy_missing(default, current):
+        copied = False
         for key, value in default.items():
             if key not in current:
                 current[key] = value
+                copied = True
             elif isinstance(value, dict):
-                copy_missing(value, current[key])
+                copied = copy_missing(value, current[key]) or copied
+        return copied
 
-    copy_missing(default_config, current_config)
-    update_config(current_config)
+    # only write if needed, it's done on every import
+    if copy_missing(default_config, current_config):
+        update_config(current_config)
 
 
 # Create default configurations file on loading.
@@ -135,7 +238,7 @@ class StoreTypeNotFound(Exception):
 
 class Environment:
     def get_private_key_path(self):
-        config = get_config()
+        config = _get_cached_config()
         private_key_path = config["private_key_path"]
         return private_key_path
 
@@ -150,14 +253,14 @@ class Environment:
         return open(private_key_path, "rb").read()
 
     def get_store_config(self, name):
-        config = get_config()
+        config = _get_cached_config()
         stores = config["stores"]
         if name not in stores:
             raise StoreTypeNotFound(f"'{name}' store is not found")
-        return stores[name]
+        return copy.deepcopy(stores[name])
 
     def get_logging_config(self):
-        return get_config()["logging"]
+        return copy.deepcopy(_get_cached_config()["logging"])
 
 
 migrate_config()
@@ -36,12 +36,56 @@ For more control, have a look at:
 
 - `events.add_global_listener`: for adding a global listener
 - `events.handle_any` and `events.handle_many`
+- `events.remove_listener`: for removing a listener
+
+Handlers of an event type are notified of its subclasses too, handlers for every event class are resolved
+(using its MRO) only once, and cached until listeners are changed (listeners must be added and removed using
+the functions above, not by changing `events.listeners` directly).
+
+A listener can be added with a `target`, then it's only notified of events with the same `target` attribute,
+e.g. a factory listens only to events of its own instances (see `jumpscale.core.base.events.InstanceEvent`).
+
+Handlers are referenced strongly by default. `Handler` objects and bound methods can be referenced weakly
+(pass `weak=True`), so they are removed automatically when they are garbage collected.
+Functions are always referenced strongly.
+
+## Delivery
+
+Every listener has a delivery policy (`delivery` of `add_listenter`):
+
+- `SYNC` (default): called by `notify` directly.
+- `THREAD`: events are put in a bounded queue, and delivered by a background thread.
+- `GEVENT`: same as `THREAD`, but using a gevent queue and a greenlet.
+
+If a queue is full, `notify` blocks until there's a free slot (backpressure).
+
+`notify_async` delivers events to `SYNC` listeners in the background thread too, so the caller never waits for handlers.
+
+Listeners added with `batch=True` get a list of events instead (`Handler.handle_batch` for handler objects),
+with all the events queued for them when they're delivered.
+
+Use `flush` to wait for all queued events to be delivered, e.g. in tests or before exit.
 
 This can be used with base classes too, you just need to define your own custom events.
 For an example, see `redis.RedisClient`
 """
+import atexit
+import queue
+import threading
+import traceback
+import weakref
+
 from collections import defaultdict
 from functools import wraps
+from inspect import ismethod
+
+
+SYNC = "sync"
+THREAD = "thread"
+GEVENT = "gevent"
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 1000
 
 
 class Any:
@@ -52,21 +96,193 @@ class Handler:
     def handle(self, ev):
         pass
 
+    def handle_batch(self, evs):
+        """
+        handle a list of events, used if the handler is added with `batch=True`
+
+        Args:
+            evs (list): events
+        """
+        for ev in evs:
+            self.handle(ev)
+
+
+_lock = threading.RLock()
+# incremented whenever listeners change, to invalidate resolved handlers
+_version = 0
+# (event type, target id) -> resolved listeners
+_resolved = {}
+
+
+def _changed():
+    global _version
+    _version += 1
+    _resolved.clear()
+
 
+class Listener:
+    """
+    a registered handler, compares equal to the handler itself
+
+    `Handler` objects and bound methods are referenced weakly if `weak` is True, then it's removed from
+    its listeners list when the handler is garbage collected.
+    """
+
+    def __init__(self, handler, listener_list, weak=False, delivery=SYNC, batch=False):
+        self.listener_list = listener_list
+        self.delivery = delivery
+        self.batch = batch
+        if weak and isinstance(handler, Handler):
+            self._ref = weakref.ref(handler, self._removed)
+        elif weak and ismethod(handler):
+            self._ref = weakref.WeakMethod(handler, self._removed)
+        else:
+            self._ref = lambda: handler
+
+    @property
+    def handler(self):
+        return self._ref()
+
+    def _removed(self, ref):
+        with _lock:
+            if self in self.listener_list:
+                self.listener_list.remove(self)
+                _changed()
+
+    def __call__(self, event):
+        self.deliver([event])
+
+    def deliver(self, evs):
+        """
+        deliver events to the handler, as a batch if it's a batch listener
+
+        Args:
+            evs (list): events
+        """
+        handler = self._ref()
+        if handler is None:
+            return
+
+        if self.batch:
+            if isinstance(handler, Handler):
+                handler.handle_batch(evs)
+            else:
+                handler(evs)
+        elif isinstance(handler, Handler):
+            for event in evs:
+                handler.handle(event)
+        else:
+            for event in evs:
+                handler(event)
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if isinstance(other, Listener):
+            other = other.handler
+        handler = self.handler
+        return handler is not None and handler == other
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f"Listener({self.handler!r})"
+
+
+class TargetListeners:
+    """listeners of a specific target, dropped when the target is garbage collected (if it can be weakly referenced)"""
+
+    def __init__(self, target):
+        key = id(target)
+        try:
+            self._ref = weakref.ref(target, lambda ref: remove_target(key))
+        except TypeError:
+            self._ref = lambda: target
+        self.listeners = defaultdict(list)
+
+    @property
+    def target(self):
+        return self._ref()
+
+
+# listeners without a target
 listeners = defaultdict(list)
 listeners[Any] = []
 
+# id(target) -> TargetListeners
+target_listeners = {}
+
+
+def remove_target(key):
+    with _lock:
+        if target_listeners.pop(key, None):
+            _changed()
+
+
+def _get_listeners(target=None, create=True):
+    if target is None:
+        return listeners
+
+    target_entry = target_listeners.get(id(target))
+    if target_entry is None or target_entry.target is not target:
+        if not create:
+            return None
+        target_entry = target_listeners[id(target)] = TargetListeners(target)
+    return target_entry.listeners
+
+
+def add_listenter(handler, *event_types, target=None, weak=False, delivery=SYNC, batch=False):
+    """
+    add a listener for some event types
 
-def add_listenter(handler, *event_types):
+    Args:
+        handler (Handler or callable): handler object or a function that takes the event
+        event_types (type): event types (classes), subclasses are handled too
+        target (any, optional): only handle events with this target (see `get_target`). Defaults to None.
+        weak (bool, optional): reference `Handler` objects and bound methods weakly. Defaults to False.
+        delivery (str, optional): delivery policy, `SYNC`, `THREAD` or `GEVENT`. Defaults to SYNC.
+        batch (bool, optional): handler takes a list of events. Defaults to False.
+
+    Raises:
+        ValueError: if no event types are given or the delivery policy is not supported
+    """
     if not event_types:
         raise ValueError("must specify at least 1 event type/class")
-    for event_type in event_types:
-        if handler not in listeners[event_type]:
-            listeners[event_type].append(handler)
+    if delivery not in DISPATCHER_TYPES and delivery != SYNC:
+        raise ValueError(f"delivery policy '{delivery}' is not supported")
+
+    with _lock:
+        registry = _get_listeners(target)
+        for event_type in event_types:
+            listener_list = registry[event_type]
+            if handler not in listener_list:
+                listener_list.append(Listener(handler, listener_list, weak=weak, delivery=delivery, batch=batch))
+        _changed()
+
+
+def add_global_listener(handler, target=None, weak=False, delivery=SYNC, batch=False):
+    add_listenter(handler, Any, target=target, weak=weak, delivery=delivery, batch=batch)
+
 
+def remove_listener(handler, *event_types, target=None):
+    """
+    remove a listener
 
-def add_global_listener(handler):
-    add_listenter(handler, Any)
+    Args:
+        handler (Handler or callable): handler object or function
+        event_types (type): event types (classes), if not given, it's removed from all event types
+        target (any, optional): target used when the listener was added. Defaults to None.
+    """
+    with _lock:
+        registry = _get_listeners(target, create=False)
+        if registry is None:
+            return
+
+        for event_type in event_types or list(registry.keys()):
+            listener_list = registry.get(event_type, [])
+            while handler in listener_list:
+                listener_list.remove(handler)
+        _changed()
 
 
 def handle_many(*event_types):
@@ -105,12 +321,225 @@ def handle(event_type):
     return decorator
 
 
-def notify(event):
-    event_type = event.__class__
-    interested = listeners.get(event_type, []) + listeners[Any]
+def get_target(event):
+    """
+    get the target of an event, it's the `target` attribute of the event if any
+
+    Args:
+        event (any): event object
+
+    Returns:
+        any: target or None
+    """
+    return getattr(event, "target", None)
+
+
+def _resolve(event_type, target):
+    registries = [listeners]
+    if target is not None:
+        registry = _get_listeners(target, create=False)
+        if registry is not None:
+            registries.append(registry)
+
+    resolved = []
+    handler_ids = set()
+    for registry in registries:
+        for cls in event_type.__mro__ + (Any,):
+            listener_list = registry.get(cls, ())
+            for listener in listener_list:
+                if not isinstance(listener, Listener):
+                    # added directly to the list
+                    listener = Listener(listener, listener_list, weak=False)
+                handler = listener.handler
+                # the same handler can be registered for an event type and its super classes
+                if handler is not None and id(handler) not in handler_ids:
+                    handler_ids.add(id(handler))
+                    resolved.append(listener)
+    return tuple(resolved)
+
+
+def get_handlers(event_type, target=None):
+    """
+    get listeners of an event type (including listeners of its super classes and global ones)
+
+    Args:
+        event_type (type): event type (class)
+        target (any, optional): include listeners of this target too. Defaults to None.
+
+    Returns:
+        tuple of Listener: listeners, call them with the event
+    """
+    key = (event_type, None if target is None else id(target))
+    resolved = _resolved.get(key)
+    if resolved is None:
+        with _lock:
+            version = _version
+            resolved = _resolve(event_type, target)
+            if version == _version:
+                _resolved[key] = resolved
+    return resolved
+
+
+class ThreadDispatcher:
+    """delivers queued events in a background (daemon) thread, the queue is bounded to `QUEUE_SIZE` events"""
+
+    def __init__(self):
+        self.queue = self.create_queue()
+        self._started = False
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def create_queue(self):
+        return queue.Queue(QUEUE_SIZE)
+
+    def start_worker(self):
+        threading.Thread(target=self.run, daemon=True, name="events-dispatcher").start()
+
+    def get_current_worker(self):
+        return threading.current_thread()
+
+    def put(self, listener, event):
+        """
+        queue an event for a listener, blocks if the queue is full
+
+        if it's called by a handler (in the worker) and the queue is full, the event is delivered directly,
+        as the worker cannot wait for itself.
+
+        Args:
+            listener (Listener): listener
+            event (any): event
+        """
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.start_worker()
+                    self._started = True
+
+        if self._worker is not None and self.get_current_worker() is self._worker:
+            try:
+                self.queue.put_nowait((listener, event))
+            except queue.Full:
+                deliver([(listener, event)])
+        else:
+            self.queue.put((listener, event))
+
+    def get_items(self):
+        # wait for an event, then get all queued events (up to BATCH_SIZE) without waiting
+        items = [self.queue.get()]
+        while len(items) < BATCH_SIZE:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def run(self):
+        self._worker = self.get_current_worker()
+        while True:
+            items = self.get_items()
+            try:
+                deliver(items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def flush(self):
+        """wait until all queued events are delivered"""
+        if self._started:
+            self.queue.join()
+
+
+class GeventDispatcher(ThreadDispatcher):
+    """delivers queued events in a greenlet, using a gevent queue"""
+
+    def create_queue(self):
+        from gevent.queue import JoinableQueue
+
+        return JoinableQueue(QUEUE_SIZE)
+
+    def start_worker(self):
+        import gevent
+
+        gevent.spawn(self.run)
+
+    def get_current_worker(self):
+        import gevent
 
-    for handler in interested:
-        if isinstance(handler, Handler):
-            handler.handle(event)
+        return gevent.getcurrent()
+
+
+DISPATCHER_TYPES = {THREAD: ThreadDispatcher, GEVENT: GeventDispatcher}
+dispatchers = {}
+
+
+def get_dispatcher(delivery):
+    """
+    get the dispatcher of a delivery policy, it's created only once
+
+    Args:
+        delivery (str): `THREAD` or `GEVENT`
+
+    Returns:
+        ThreadDispatcher: dispatcher
+    """
+    dispatcher = dispatchers.get(delivery)
+    if dispatcher is None:
+        with _lock:
+            dispatcher = dispatchers.get(delivery)
+            if dispatcher is None:
+                dispatcher = dispatchers[delivery] = DISPATCHER_TYPES[delivery]()
+    return dispatcher
+
+
+def deliver(items):
+    """
+    deliver (listener, event) items, events of every listener are delivered together (in order)
+
+    Args:
+        items (list of tuple): (listener, event) items
+    """
+    events_per_listener = {}
+    for listener, event in items:
+        events_per_listener.setdefault(listener, []).append(event)
+
+    for listener, evs in events_per_listener.items():
+        try:
+            listener.deliver(evs)
+        except Exception:
+            # a failing handler should not stop the delivery to others
+            traceback.print_exc()
+
+
+def notify(event):
+    """
+    notify listeners of an event, `SYNC` listeners are called directly, others are queued
+
+    Args:
+        event (any): event object
+    """
+    for listener in get_handlers(event.__class__, get_target(event)):
+        if listener.delivery == SYNC:
+            listener(event)
         else:
-            handler(event)
+            get_dispatcher(listener.delivery).put(listener, event)
+
+
+def notify_async(event):
+    """
+    notify listeners of an event without waiting for any of them, `SYNC` listeners are called in a background thread
+
+    Args:
+        event (any): event object
+    """
+    for listener in get_handlers(event.__class__, get_target(event)):
+        delivery = THREAD if listener.delivery == SYNC else listener.delivery
+        get_dispatcher(delivery).put(listener, event)
+
+
+def flush():
+    """wait until all queued events are delivered"""
+    for dispatcher in list(dispatchers.values()):
+        dispatcher.flush()
+
+
+atexit.register(flush)
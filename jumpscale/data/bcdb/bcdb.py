@@ -1,21 +1,30 @@
 from redis import Redis
 import json
 from jumpscale.data.bcdb import models as models
-from .clients import RedisStorageClient, RedisIndexClient, SonicIndexTextClient, SQLiteIndexSetClient
+from .clients import (
+    RedisStorageClient,
+    RedisIndexClient,
+    SonicIndexTextClient,
+    SQLiteIndexSetClient,
+    SQLiteIndexTextClient,
+)
+
 
 class BCDB:
-    def __init__(self, ns):
+    def __init__(self, ns, indexer_text=None):
+        """
+        Args:
+            ns (str): The namespace.
+            indexer_text (IndexTextInterface, optional): The full-text index client,
+                e.g. `SonicIndexTextClient(ns)`. Defaults to a local `SQLiteIndexTextClient(ns)`.
+        """
         self.ns = ns
         self.storage = RedisStorageClient(ns)
         self.indexer = RedisIndexClient(ns)
         self.indexer_set = SQLiteIndexSetClient(ns)
-        self.indexer_text = SonicIndexTextClient(ns)
-        self.models = {
-            
-        }
-        self.loaded_models = {
-
-        }
+        self.indexer_text = indexer_text or SQLiteIndexTextClient(ns)
+        self.models = {}
+        self.loaded_models = {}
         self.detect_models()
         self.model_model = self.models["model"](self)
 
@@ -25,36 +34,80 @@ class BCDB:
             model = getattr(models, model_name)
             if isinstance(model, type) and issubclass(model, models.ModelBase):
                 self.models[model._name] = model
-    
+
     def save_obj(self, model, obj):
         """Saves the given objects which belongs to model in the db and update the indexes.
+
+        The previous version of the object is fetched once to compute which indexes changed,
+        then the object and its changed redis indexes are written in one transaction (MULTI/EXEC),
+        so they never diverge. The storage and the redis index must use the same redis server.
         
         Args:
             model (ModelObj): The model object that obj belongs to.
             obj (JSObjBase): The object that will be saved.
         """
+        old_obj = self.get_item_by_id(model, obj.id)
+        pipeline = self.storage.pipeline()
+        self._queue_obj(model, obj, old_obj, pipeline)
+        pipeline.execute()
+
         self.indexer_set.set(model, obj)
         self.indexer_text.set(model, obj)
+
+    def save_many(self, model, objs, batch_size=1000):
+        """Saves many objects which belong to model, in batches.
+
+        Every batch costs one MGET for the previous versions, one transaction for the storage and redis indexes,
+        and one bulk write for each of the other indexes.
+
+        Args:
+            model (ModelObj): The model object that objs belong to.
+            objs (list of JSObjBase): The objects that will be saved.
+            batch_size (int, optional): Number of objects saved at once. Defaults to 1000.
+        """
+        objs = list(objs)
+        for i in range(0, len(objs), batch_size):
+            batch = objs[i : i + batch_size]
+            old_objs = self.storage.get_many(model, [obj.id for obj in batch])
+            pipeline = self.storage.pipeline()
+            for obj, old_obj in zip(batch, old_objs):
+                self._queue_obj(model, obj, old_obj, pipeline)
+            pipeline.execute()
+
+            self.indexer_set.set_many(model, batch)
+            self.indexer_text.set_many(model, batch)
+
+    def _queue_obj(self, model, obj, old_obj, pipeline):
+        """Queues writing the object and its changed redis indexes on the pipeline.
+
+        Args:
+            model (ModelObj): The model object that obj belongs to.
+            obj (JSObjBase): The object that will be saved.
+            old_obj (JSObjBase or None): The previous version of the object.
+            pipeline (redis.client.Pipeline): The pipeline.
+        """
         for prop in model.schema.props.values():
-            old_obj = model.get_by('id', obj.id)
-            prop_name = prop.name
-            index_prop = getattr(obj, prop.name)
+            if not prop.index:
+                continue
+            index_value = getattr(obj, prop.name)
             old_index = getattr(old_obj, prop.name) if old_obj else None
-            if prop.index:
-                self.indexer.set(model, prop_name, index_prop, obj.id, old_index)
-        self.storage.set(model, obj.id, obj)
+            if old_obj and old_index == index_value:
+                continue
+            self.indexer.set(model, prop.name, index_value, obj.id, old_index, pipeline=pipeline)
+        self.storage.set(model, obj.id, obj, pipeline=pipeline)
 
-    def model_id_incr(self, model):
+    def model_id_incr(self, model, count=1):
         """Increment the id counter in the model and returns the new id.
         Used to assign unique id for each created object.
         
         Args:
             model (ModelObj): The model object.
+            count (int, optional): Number of ids to reserve at once. Defaults to 1.
         
         Returns:
-            int: The new unique id
+            int: The new unique id, the last one if count is more than 1
         """
-        return self.storage.incr_id(model)
+        return self.storage.incr_id(model, count)
 
     def get_item_by_id(self, model, id):
         """Gets the object in the model with the given id.
@@ -68,11 +121,24 @@ class BCDB:
         """
         return self.storage.get(model, id)
 
+    def get_items_by_ids(self, model, ids):
+        """Gets the objects in the model with the given ids.
+
+        Args:
+            model (ModelObj): The model to be searched in.
+            ids (list of int): The objects' ids.
+
+        Returns:
+            List[JSObjBase or None]: The objects in the same order of ids, None for missing ones.
+        """
+        return self.storage.get_many(model, ids)
+
     def get_entry(self, model, key, val):
         """Search for objects whose key equal val.
         1. It searches in the redis index if key is indexed.
         2. Else, It's searched for in the sqlite index if the key is indexed for range search.
-        3. Else, All objects in the db belonging to the given model is scanned linearly to determine the matching object.
+        3. Else, All objects in the db belonging to the given model is scanned linearly to determine
+           the matching object.
         
         Args:
             model (ModelObj): The model in which the key is searched for.
@@ -93,10 +159,8 @@ class BCDB:
             found = self.get_item_from_index_set(model, key, val, val)
             return found[0] if found else None
         else:
-            for obj in self.storage.get_keys_in_model(model):
-                if getattr(obj, key) == val:
-                    return obj
-        return None
+            # stops scanning at the first match
+            return next((obj for obj in self.storage.iter_model(model) if getattr(obj, key) == val), None)
 
     def get_range(self, model, key, min, max):
         """Searches for objects whose key lies between min and max.
@@ -116,16 +180,10 @@ class BCDB:
         """
         if key not in model.schema.props:
             raise RuntimeError(f"{key} is not a part of {model.name}'s schema")
-        if not model.schema.props[key].index_key:
+        if model.schema.props[key].index_key:
             return self.get_item_from_index_set(model, key, min, max)
         else:
-            result = []
-            for obj in self.storage.get_keys_in_model(model):
-                    obj_val = getattr(obj, key)
-                    if obj_val >= min and obj_val <= max:
-                        result.append(obj)
-            return result
-            
+            return [obj for obj in self.storage.iter_model(model) if min <= getattr(obj, key) <= max]
 
     def get_item_from_index(self, model, key, val):
         """Search for objects whose key equal val. The key must be indexed for search.
@@ -170,10 +228,10 @@ class BCDB:
         if not model.schema.props[key].index_key:
             raise RuntimeError(f"{key} is not indexed.")
         return [self.get_item_by_id(model, x[0]) for x in self.indexer_set.get(model, key, min, max)]
-        
 
     def get_item_from_index_text(self, model, key, pattern):
-        """Searches for objects whose key matches the given pattern inside model. The key must be registered in the text index.
+        """Searches for objects whose key matches the given pattern inside model.
+        The key must be registered in the text index.
         
         Args:
             model (Modelobj): The model object in which the pattern is searched.
@@ -181,7 +239,8 @@ class BCDB:
             pattern (str): The pattern to be searched for.
         
         Notes:
-            Currently sonic server matches for some patterns and doesn't for others.
+            With the default sqlite index, the pattern can contain words, prefixes (`wor*`)
+            and phrases (`"some words"`), results are ordered by relevance.
 
         Raises:
             RuntimeError: If the key is not defined in the model.
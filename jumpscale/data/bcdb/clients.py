@@ -1,17 +1,24 @@
 from .interfaces import *
 from redis import Redis
 import json
-import sqlite3
+import os
+import re
 from jumpscale.god import j
+from jumpscale.core.base.store import get_sqlite_connection
+
 
 class JSONSerializer(SerializerInterface):
     def loads(self, model, s):
         return model.load_obj_from_dict(json.loads(s))
-        
+
     def dumps(self, model, data):
         return json.dumps(model.get_dict(data))
 
+
 class RedisStorageClient(StorageInterface):
+    SCAN_COUNT = 1000
+    MGET_BATCH_SIZE = 1000
+
     def __init__(self, bcdb_namespace, host="localhost", port=6379, serializer=None):
         self.redis_client = Redis(host=host, port=port)
         self.serializer = serializer or JSONSerializer()
@@ -20,22 +27,82 @@ class RedisStorageClient(StorageInterface):
     def get(self, model, obj_id):
         obj_str = self.redis_client.get(f"{self.bcdb_namespace}.{model.name}://{obj_id}")
         return self.serializer.loads(model, obj_str) if obj_str else None
-    
-    def set(self, model, obj_id, value):
-        return self.redis_client.set(f"{self.bcdb_namespace}.{model.name}://{obj_id}", self.serializer.dumps(model, value))
-    
-    def get_keys_in_model(self, model):
-        pattern = f"{self.bcdb_namespace}.{model.name}://*"
+
+    def set(self, model, obj_id, value, pipeline=None):
+        client = pipeline if pipeline is not None else self.redis_client
+        return client.set(f"{self.bcdb_namespace}.{model.name}://{obj_id}", self.serializer.dumps(model, value))
+
+    def pipeline(self):
+        """Creates a transactional pipeline, commands queued on it are executed atomically (MULTI/EXEC) on `execute`.
+
+        Returns:
+            redis.client.Pipeline: The pipeline.
+        """
+        return self.redis_client.pipeline(transaction=True)
+
+    def get_many(self, model, obj_ids, batch_size=1000):
+        """Gets many objects using MGET in batches.
+
+        Args:
+            model (ModelObj): The model object.
+            obj_ids (list of int): The objects' ids.
+            batch_size (int, optional): Number of objects fetched per MGET. Defaults to 1000.
+
+        Returns:
+            list: The objects in the same order of obj_ids, None for missing ones.
+        """
+        obj_ids = list(obj_ids)
         result = []
-        cur, keys  = self.redis_client.scan(cursor=0, match=pattern, count=2)
-        result.extend(keys)
-        while cur != 0:
-            cur, keys = self.redis_client.scan(cursor=cur, match=pattern, count=2)
-            result.extend(keys)
-        return [self.get(model, int(x.split(b'://')[1])) for x in result]
-        
-    def incr_id(self, model):
-        return self.redis_client.incr(f"{self.bcdb_namespace}.{model.name}.lastid")
+        for i in range(0, len(obj_ids), batch_size):
+            keys = [f"{self.bcdb_namespace}.{model.name}://{obj_id}" for obj_id in obj_ids[i : i + batch_size]]
+            result.extend(self.serializer.loads(model, x) if x else None for x in self.redis_client.mget(keys))
+        return result
+
+    def iter_model(self, model, count=None, batch_size=None):
+        """Iterates over all objects in the model without loading them all in memory.
+        Keys are scanned with SCAN, values are fetched with MGET in batches and deserialized lazily.
+
+        Args:
+            model (ModelObj): The model object.
+            count (int, optional): SCAN COUNT hint. Defaults to `SCAN_COUNT`.
+            batch_size (int, optional): Number of values fetched per MGET. Defaults to `MGET_BATCH_SIZE`.
+
+        Yields:
+            JSObjBase: The objects.
+        """
+        count = count or self.SCAN_COUNT
+        batch_size = batch_size or self.MGET_BATCH_SIZE
+        pattern = f"{self.bcdb_namespace}.{model.name}://*"
+        keys = []
+        for key in self.redis_client.scan_iter(match=pattern, count=count):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                yield from self._load_values(model, keys)
+                keys = []
+        if keys:
+            yield from self._load_values(model, keys)
+
+    def _load_values(self, model, keys):
+        for value in self.redis_client.mget(keys):
+            # deleted since scanned
+            if value:
+                yield self.serializer.loads(model, value)
+
+    def get_keys_in_model(self, model):
+        return list(self.iter_model(model))
+
+    def incr_id(self, model, count=1):
+        """Increments the id counter of the model by count.
+
+        Args:
+            model (ModelObj): The model object.
+            count (int, optional): The number of ids to reserve. Defaults to 1.
+
+        Returns:
+            int: The last reserved id, reserved ids are (last - count + 1) to last.
+        """
+        return self.redis_client.incrby(f"{self.bcdb_namespace}.{model.name}.lastid", count)
+
 
 class RedisIndexClient(IndexInterface):
     def __init__(self, bcdb_namespace, host="localhost", port=6379):
@@ -43,65 +110,184 @@ class RedisIndexClient(IndexInterface):
         self.bcdb_namespace = bcdb_namespace
 
     def get(self, model, index_prop, index_value):
-        res = (self.redis_client.get(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{index_value}"))
+        res = self.redis_client.get(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{index_value}")
         return int(res) if res else None
 
-    def set(self, model, index_prop, index_value, obj_id, old_value=None):
-        if old_value:
-            self.redis_client.delete(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{old_value}")
-        return self.redis_client.set(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{index_value}", obj_id)
+    def get_many(self, model, index_prop, index_values):
+        """Gets ids of objects with the given index values using one MGET.
+
+        Returns:
+            list: ids in the same order of index_values, None for missing values.
+        """
+        index_values = list(index_values)
+        if not index_values:
+            return []
+        keys = [f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{value}" for value in index_values]
+        return [int(res) if res else None for res in self.redis_client.mget(keys)]
+
+    def set(self, model, index_prop, index_value, obj_id, old_value=None, pipeline=None):
+        client = pipeline if pipeline is not None else self.redis_client
+        if old_value is not None:
+            client.delete(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{old_value}")
+        return client.set(f"{self.bcdb_namespace}.indexer.{model.name}.{index_prop}://{index_value}", obj_id)
+
 
 class SQLiteIndexSetClient(IndexSetInterface):
     def __init__(self, bcdb_namespace):
         self.bcdb_namespace = bcdb_namespace
-    
+        self.path = os.path.abspath(f"{self.bcdb_namespace}_index.db")
+        # tables already created, and sql statements per model (sqlite3 caches their prepared statements per connection)
+        self._tables = set()
+        self._statements = {}
+
+    @property
+    def connection(self):
+        return get_sqlite_connection(self.path)
+
+    def _get_props(self, model):
+        return [prop for prop in model.schema.props.values() if prop.name != "id" and prop.index_key]
+
     def _create_if_not_exists(self, model):
-        conn = sqlite3.connect(f"{self.bcdb_namespace}_index.db")
-        c = conn.cursor()
         table_name = f"{model.name}"
-        c.execute(f"SELECT count(*) FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        if c.fetchone()[0] != 0:
+        if table_name in self._tables:
             return None
-        props = []
+
+        props = self._get_props(model)
         props_str = ""
-        for prop in model.schema.props.values():
-            if prop.name != 'id' and prop.index_key:
-                prop_type = "INTEGER" if isinstance(prop.type, j.data.types.Integer) else "TEXT"
-                props_str += f", {prop.name} {prop_type}"
-                props.append(prop.name)
-        
-        c.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (id int primary key{props_str})")
         for prop in props:
-            c.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{prop}_index on {table_name}({prop})")
-        conn.commit()
-        conn.close()
-        
+            prop_type = "INTEGER" if isinstance(prop.type, j.data.types.Integer) else "TEXT"
+            props_str += f", {prop.name} {prop_type}"
+
+        with self.connection as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (id int primary key{props_str})")
+            for prop in props:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{prop.name}_index on {table_name}({prop.name})")
+        self._tables.add(table_name)
+
+    def _get_statement(self, model, name, index_prop=None):
+        key = (model.name, name, index_prop)
+        if key not in self._statements:
+            table_name = f"{model.name}"
+            if name == "get":
+                statement = f"SELECT id FROM {table_name} WHERE {index_prop} >= ? and {index_prop} <= ?"
+            else:
+                prop_names = [prop.name for prop in self._get_props(model)]
+                props_str = ", ".join(["id", *prop_names])
+                statement = f"REPLACE INTO {table_name} ({props_str}) VALUES (?{', ?' * len(prop_names)})"
+            self._statements[key] = statement
+        return self._statements[key]
+
     def get(self, model, index_prop, min, max):
         self._create_if_not_exists(model)
-        conn = sqlite3.connect(f"{self.bcdb_namespace}_index.db")
-        c = conn.cursor()
-        table_name = f"{model.name}"
-        c.execute(f"SELECT id FROM {table_name} WHERE {index_prop} >= ? and {index_prop} <= ?", (min, max))
-        res = c.fetchall()
-        conn.close()
-        return res
+        return self.connection.execute(self._get_statement(model, "get", index_prop), (min, max)).fetchall()
 
     def set(self, model, obj):
+        self.set_many(model, [obj])
+
+    def set_many(self, model, objs):
         self._create_if_not_exists(model)
-        conn = sqlite3.connect(f"{self.bcdb_namespace}_index.db")
-        c = conn.cursor()
-        table_name = f"{model.name}"
-        props_str = "id"
-        props = [obj.id]
-        for prop in model.schema.props.values():
-            if prop.name != "id" and prop.index_key:
-                props_str += f", {prop.name}"
-                props.append(getattr(obj, prop.name))
-            
-        c.execute(f"REPLACE INTO {table_name} ({props_str}) VALUES (?{', ?' * (len(props) - 1)})", props)
-        conn.commit()
-        conn.close()
-        
+        props = self._get_props(model)
+        rows = [[obj.id, *[getattr(obj, prop.name) for prop in props]] for obj in objs]
+        with self.connection as conn:
+            conn.executemany(self._get_statement(model, "set"), rows)
+
+
+class SQLiteIndexTextClient(IndexTextInterface):
+    """Full-text index using sqlite FTS5, stored in the same database file of `SQLiteIndexSetClient`.
+
+    Every model has one FTS5 table with a column per text-indexed property, and the object id as its rowid.
+    Patterns can contain words, prefixes (`wor*`) and phrases (`"some words"`), all must match,
+    results are ranked by relevance (bm25).
+    """
+
+    def __init__(self, bcdb_namespace):
+        self.bcdb_namespace = bcdb_namespace
+        self.path = os.path.abspath(f"{self.bcdb_namespace}_index.db")
+        self._tables = set()
+
+    @property
+    def connection(self):
+        return get_sqlite_connection(self.path)
+
+    def _get_table_name(self, model):
+        return f"{model.name}_text"
+
+    def _get_props(self, model):
+        return [prop for prop in model.schema.props.values() if prop.index_text]
+
+    def _create_if_not_exists(self, model):
+        table_name = self._get_table_name(model)
+        if table_name in self._tables:
+            return None
+
+        columns = ", ".join(prop.name for prop in self._get_props(model))
+        with self.connection as conn:
+            # prefix indexes make prefix queries of 2 and 3 characters fast
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name} USING fts5({columns}, prefix='2 3')")
+        self._tables.add(table_name)
+
+    def _to_query(self, pattern):
+        """Converts a pattern to an FTS5 query, every word or phrase is quoted so it's matched literally.
+
+        Args:
+            pattern (str): The pattern, e.g. `hello wor*` or `"hello world"`.
+
+        Returns:
+            str: The FTS5 query.
+        """
+        terms = []
+        for phrase, word, prefix in re.findall(r'"([^"]*)"|([^\s"*]+)(\*?)', pattern):
+            term = phrase if phrase else word
+            if term.strip():
+                terms.append('"{}"{}'.format(term.replace('"', '""'), prefix))
+        return " ".join(terms)
+
+    def set(self, model, obj):
+        self.set_many(model, [obj])
+
+    def set_many(self, model, objs):
+        props = self._get_props(model)
+        if not props:
+            return
+        self._create_if_not_exists(model)
+
+        table_name = self._get_table_name(model)
+        columns = ", ".join(prop.name for prop in props)
+        rows = []
+        for obj in objs:
+            values = [getattr(obj, prop.name) for prop in props]
+            rows.append([obj.id, *["" if value is None else str(value) for value in values]])
+
+        # replace the old version of the objects
+        with self.connection as conn:
+            conn.executemany(f"DELETE FROM {table_name} WHERE rowid = ?", [[row[0]] for row in rows])
+            conn.executemany(f"INSERT INTO {table_name} (rowid, {columns}) VALUES (?{', ?' * len(props)})", rows)
+
+    def delete(self, model, obj_ids):
+        """Removes objects from the index.
+
+        Args:
+            model (ModelObj): The model object.
+            obj_ids (list of int): The objects' ids.
+        """
+        if not self._get_props(model):
+            return
+        self._create_if_not_exists(model)
+        with self.connection as conn:
+            conn.executemany(f"DELETE FROM {self._get_table_name(model)} WHERE rowid = ?", [[i] for i in obj_ids])
+
+    def get(self, model, index_prop, pattern):
+        query = self._to_query(pattern)
+        if not query:
+            return []
+        self._create_if_not_exists(model)
+
+        table_name = self._get_table_name(model)
+        rows = self.connection.execute(
+            f"SELECT rowid FROM {table_name} WHERE {table_name} MATCH ? ORDER BY rank", (f"{index_prop} : ({query})",)
+        )
+        return [row[0] for row in rows]
+
 
 class SonicIndexTextClient(IndexTextInterface):
     def __init__(self, bcdb_namespace):
@@ -112,11 +298,22 @@ class SonicIndexTextClient(IndexTextInterface):
             self.sonic_client = j.clients.sonic.get(self.bcdb_namespace)
 
     def set(self, model, obj):
-       for prop in model.schema.props.values():
-           if prop.index_text:
-               self.sonic_client.push(self.bcdb_namespace, f"{model.name}_{prop.name}", str(obj.id), str(getattr(obj, prop.name)))
+        for prop in model.schema.props.values():
+            if prop.index_text:
+                self.sonic_client.push(
+                    self.bcdb_namespace, f"{model.name}_{prop.name}", str(obj.id), str(getattr(obj, prop.name))
+                )
+
+    def set_many(self, model, objs):
+        # sonic has no bulk push
+        for obj in objs:
+            self.set(model, obj)
+
+    def delete(self, model, obj_ids):
+        for obj_id in obj_ids:
+            for prop in model.schema.props.values():
+                if prop.index_text:
+                    self.sonic_client.flush_object(self.bcdb_namespace, f"{model.name}_{prop.name}", str(obj_id))
 
     def get(self, model, index_prop, pattern):
         return self.sonic_client.query(self.bcdb_namespace, f"{model.name}_{index_prop}", pattern)
-        
-               
\ No newline at end of file
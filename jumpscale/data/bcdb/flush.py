@@ -1,9 +1,12 @@
 def main():
     import os
-    from jumpscale.god import j
+    from jumpscale.core.base.store import close_sqlite_connection
 
-    with open("test_index.db", "w"):
-        pass
+    # range and text indexes, the database is in WAL mode, so its -wal and -shm files are removed too
+    close_sqlite_connection("test_index.db")
+    for path in ("test_index.db", "test_index.db-wal", "test_index.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
     print(os.system("redis-cli --scan  --pattern 'test.indexer.quote.id://*' | xargs redis-cli del"))
     print(os.system("redis-cli --scan  --pattern 'test.quote://*' | xargs redis-cli del"))
@@ -14,7 +17,6 @@ def main():
     print(os.system("redis-cli --scan  --pattern 'test.indexer.db.id://*' | xargs redis-cli del"))
     print(os.system("redis-cli --scan  --pattern 'test.db://*' | xargs redis-cli del"))
     print(os.system("redis-cli --scan  --pattern 'test.db.las*' | xargs redis-cli del"))
-    j.clients.sonic.get("test").flush_collection("test")
 
 
 if __name__ == "__main__":
@@ -1,17 +1,26 @@
-
 class StorageInterface:
     def get(self, model, obj_id):
         pass
 
-    def set(self, model, obj_id, value):
+    def set(self, model, obj_id, value, pipeline=None):
+        pass
+
+    def pipeline(self):
+        pass
+
+    def get_many(self, model, obj_ids):
+        pass
+
+    def iter_model(self, model, count=None, batch_size=None):
         pass
 
     def get_keys_in_model(self, model):
         pass
 
-    def incr_id(self, model):
+    def incr_id(self, model, count=1):
         pass
 
+
 class IndexInterface:
     def __init__(self, bcdb_namespace):
         pass
@@ -19,9 +28,13 @@ class IndexInterface:
     def get(self, model, index_prop, index_value):
         pass
 
-    def set(self, model, index_prop, index_value, obj_id, old_value=None):
+    def get_many(self, model, index_prop, index_values):
         pass
 
+    def set(self, model, index_prop, index_value, obj_id, old_value=None, pipeline=None):
+        pass
+
+
 class IndexSetInterface:
     def __init__(self, bcdb_namespace):
         pass
@@ -32,19 +45,30 @@ class IndexSetInterface:
     def set(self, model, obj):
         pass
 
+    def set_many(self, model, objs):
+        pass
+
+
 class IndexTextInterface:
     def __init__(self, bcdb_namespace):
         pass
 
     def set(self, model, obj):
-       pass
+        pass
+
+    def set_many(self, model, objs):
+        pass
+
+    def delete(self, model, obj_ids):
+        pass
 
     def get(self, model, index_prop, pattern):
-        pass 
+        pass
+
 
 class SerializerInterface:
     def loads(self, model, s):
         pass
 
     def dumps(self, model, data):
-        pass
\ No newline at end of file
+        pass
@@ -3,6 +3,7 @@ from jumpscale.data.schema import Property
 from jumpscale.data.types import Integer, JSObject
 import json
 
+
 class JSObjBase:
     def __init__(self, model):
         self.model = model
@@ -16,9 +17,11 @@ class JSObjBase:
     def __str__(self):
         return json.dumps(self.get_dict(), indent=4)
 
+
 class ModelBase:
     _schema = ""
     _name = ""
+
     def __init__(self, bcdb):
         self.schema = self._load_schema()
         self.schema.props["id"] = Property()
@@ -26,13 +29,13 @@ class ModelBase:
         self.schema.props["id"].index = True
         self.schema.props["id"].type = Integer()
         self.schema.props["id"].name = "id"
-        
+
         self.bcdb = bcdb
         self.name = self._name
 
     def _load_schema(self):
         return j.data.schema.parse_schema(self._schema)
-    
+
     def create_obj(self, data):
         """Create a new object and assign a new id to it with the given data dict.
         Missing props are defaultly initialized.
@@ -44,10 +47,30 @@ class ModelBase:
             JSObjBase: The newly created 
         """
         o = JSObjBase(self)
-        data['id'] = self._incr_id()
+        data["id"] = self._incr_id()
         self.set_from_dict(o, data)
         return o
 
+    def create_many(self, data_list):
+        """Create many objects with the given data dicts, ids are reserved for all of them at once.
+
+        Args:
+            data_list (list of dict): The data dicts that are used to create the objects.
+
+        Returns:
+            list[JSObjBase]: The newly created objects.
+        """
+        data_list = list(data_list)
+        if not data_list:
+            return []
+        first_id = self._incr_id(len(data_list)) - len(data_list) + 1
+        objs = []
+        for obj_id, data in enumerate(data_list, first_id):
+            o = JSObjBase(self)
+            data["id"] = obj_id
+            objs.append(self.set_from_dict(o, data))
+        return objs
+
     def _assert_uniqueness(self, obj):
         """Checks that the object doesn't contain an already existing property that is marked as unique.
         
@@ -62,7 +85,34 @@ class ModelBase:
                 dbobj = self.get_by(prop.name, getattr(obj, prop.name))
                 if dbobj is not None and dbobj.id != obj.id:
                     raise RuntimeError(f"{prop.name} is unique. One already exists.")
-    
+
+    def _assert_uniqueness_many(self, objs):
+        """Checks that the objects don't contain an already existing property that is marked as unique,
+        or the same unique value twice. Indexed properties are checked for all objects at once.
+
+        Args:
+            objs (list of JSObjBase): The JS Objects.
+
+        Raises:
+            RuntimeError: If they contain a duplicate of a unique value.
+        """
+        for prop in self.schema.props.values():
+            if not prop.unique or prop.name == "id":
+                continue
+            values = [getattr(obj, prop.name) for obj in objs]
+            if len(set(values)) != len(values):
+                raise RuntimeError(f"{prop.name} is unique. Objects contain duplicates.")
+            if prop.index:
+                ids = self.bcdb.indexer.get_many(self, prop.name, values)
+                for obj, obj_id in zip(objs, ids):
+                    if obj_id is not None and obj_id != obj.id:
+                        raise RuntimeError(f"{prop.name} is unique. One already exists.")
+            else:
+                for obj in objs:
+                    dbobj = self.get_by(prop.name, getattr(obj, prop.name))
+                    if dbobj is not None and dbobj.id != obj.id:
+                        raise RuntimeError(f"{prop.name} is unique. One already exists.")
+
     def save_obj(self, obj):
         """Saves the object to the db. It forwards the call to the bcdb client.
         
@@ -72,19 +122,44 @@ class ModelBase:
         self._assert_uniqueness(obj)
         self.bcdb.save_obj(self, obj)
 
-    def _incr_id(self):
+    def save_many(self, objs):
+        """Saves many objects to the db in batches. It forwards the call to the bcdb client.
+
+        Args:
+            objs (list of JSObjBase): The objects to be saved.
+        """
+        objs = list(objs)
+        self._assert_uniqueness_many(objs)
+        self.bcdb.save_many(self, objs)
+
+    def get_many(self, ids):
+        """Gets many objects by their ids at once.
+
+        Args:
+            ids (list of int): The objects' ids.
+
+        Returns:
+            list[JSObjBase or None]: The objects in the same order of ids, None for missing ones.
+        """
+        return self.bcdb.get_items_by_ids(self, ids)
+
+    def _incr_id(self, count=1):
         """Increment the id counter and returns the newly incremented unique id.
+
+        Args:
+            count (int, optional): Number of ids to reserve at once. Defaults to 1.
         
         Returns:
-            int: The new id.
+            int: The new id, the last one if count is more than 1.
         """
-        return self.bcdb.model_id_incr(self)
-    
+        return self.bcdb.model_id_incr(self, count)
+
     def get_by(self, key, value):
         """Search for objects whose key equal value.
         1. It searches in the redis index if key is indexed.
         2. Else, It's searched for in the sqlite index if the key is indexed for range search.
-        3. Else, All objects in the db belonging to the given model is scanned linearly to determine the matching object.
+        3. Else, All objects in the db belonging to the given model is scanned linearly to determine
+           the matching object.
         
         Args:
             key (str): The model property that is checked for.
@@ -99,17 +174,19 @@ class ModelBase:
         return self.bcdb.get_entry(self, key, value)
 
     def get_range(self, key, min, max):
-        return self.bcdb.get_item_from_index_set(self, key, min, max)
-    
+        return self.bcdb.get_range(self, key, min, max)
+
     def get_pattern(self, key, pattern):
-        """Searches for objects whose key matches the given pattern in this model. The key must be registered in the text index.
+        """Searches for objects whose key matches the given pattern in this model.
+        The key must be registered in the text index.
         
         Args:
             key (str): The model property that the pattern is searched for in.
             pattern (str): The pattern to be searched for.
         
         Notes:
-            Currently sonic server matches for some patterns and doesn't for others.
+            With the default sqlite index, the pattern can contain words, prefixes (`wor*`)
+            and phrases (`"some words"`), results are ordered by relevance.
 
         Raises:
             RuntimeError: If the key is not defined in the model.
@@ -119,7 +196,7 @@ class ModelBase:
             list[JSObjBase]: List of matching objects (o: o.key matches pattern).
         """
         return self.bcdb.get_item_from_index_text(self, key, pattern)
-    
+
     def get_dict(self, obj):
         """Extracts a dict with all attributes from obj.
         
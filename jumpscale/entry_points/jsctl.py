@@ -1,6 +1,9 @@
+import json
+
 import click
 
 from jumpscale.core.config import get_default_config, update_config, get_config
+from jumpscale.tools.startupprofile import profile_startup, format_records
 
 
 def format_config_parameter(name, value):
@@ -44,13 +47,52 @@ def update(name, value):
     click.echo("Updated.")
 
 
+@config.command()
+@click.option("--filesystem-path", help="filesystem store path, defaults to the configured one")
+@click.option("--sqlite-path", help="sqlite store database path, defaults to the configured one")
+@click.option("--use", is_flag=True, help="use sqlite store after migration")
+def migrate_to_sqlite(filesystem_path, sqlite_path, use):
+    """copy all stored instances from filesystem store to sqlite store"""
+    from jumpscale.core.base.store import migrate_filesystem_to_sqlite
+
+    count = migrate_filesystem_to_sqlite(filesystem_path=filesystem_path, sqlite_path=sqlite_path)
+    click.echo(f"Migrated {count} instances.")
+
+    if use:
+        config = get_config()
+        config["store"] = "sqlite"
+        update_config(config)
+        click.echo("Now using sqlite store.")
+
+
+@click.command()
+@click.option("--save", help="save the measurements as json to this path")
+@click.option("--compare", help="compare with measurements saved before (using --save)")
+@click.option("--limit", type=int, help="show only the slowest N entries")
+def startup_profile(save, compare, limit):
+    """measure time spent in config, god object loading, package imports and export_module_as()"""
+    records = profile_startup()
+
+    previous = None
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)
+
+    click.echo(format_records(records, previous=previous, limit=limit))
+
+    if save:
+        with open(save, "w") as f:
+            json.dump(records, f, indent=2)
+        click.echo(f"Saved to {save}")
+
+
 @click.group()
 def cli():
     pass
 
 
 cli.add_command(config)
+cli.add_command(startup_profile)
 
 if __name__ == "__main__":
     cli()
-
@@ -1,20 +1,260 @@
+"""`jsng` is js-ng shell, it can be used as an interactive shell or to evaluate snippets.
+
+```
+~> jsng                                  # interactive shell
+~> jsng "j.data.hash.md5('x')"           # evaluate an expression
+```
+
+## warm server
+
+Loading `j` and the packages used by a snippet takes most of the time of a short `jsng` call,
+a server can keep a fully loaded `j` in a long-lived process:
+
+```
+~> jsng --server                         # listens on ~/.jsng/jsng.sock
+~> jsng -c "j.data.hash.md5('x')"        # runs the snippet in the server
+```
+
+Every request is handled in a forked child of the server (zygote), so requests are isolated from each other,
+but they inherit all the already imported modules. stdout, stderr and the result are streamed back to the client.
+
+If no server is running, `jsng -c` evaluates the snippet locally.
+"""
+import argparse
+import json
 import os
 import pathlib
+import signal
+import socket
 import sys
-
-from jumpscale.god import j
-from jumpscale.shell import ptconfig
-
-from ptpython.repl import embed
+import traceback
 
 BASE_CONFIG_DIR = os.path.join(os.environ.get("HOME", "/root"), ".jsng")
 HISTORY_FILENAME = os.path.join(BASE_CONFIG_DIR, "history.txt")
+SOCKET_PATH = os.path.join(BASE_CONFIG_DIR, "jsng.sock")
+
+
+def send_message(f, **message):
+    f.write(json.dumps(message).encode() + b"\n")
+    f.flush()
+
+
+def read_message(f):
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line.decode())
+
+
+class StreamWriter:
+    """file-like object that forwards every write to the client as a message"""
+
+    def __init__(self, f, name):
+        self.f = f
+        self.name = name
+
+    def write(self, data):
+        if data:
+            send_message(self.f, **{self.name: data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def evaluate(code, namespace):
+    """evaluate an expression, or execute statements if it's not an expression
+
+    Args:
+        code (str): snippet
+        namespace (dict): globals to be used
+
+    Returns:
+        any: the value of the expression, None for statements
+    """
+    try:
+        compiled = compile(code, "<jsng>", "eval")
+    except SyntaxError:
+        exec(compile(code, "<jsng>", "exec"), namespace)
+        return None
+    return eval(compiled, namespace)
+
+
+def preload(j):
+    """import all packages of all subnamespaces, so forked children do not need to"""
+    for namespace_name in dir(j):
+        namespace = getattr(j, namespace_name, None)
+        for name in dir(namespace):
+            try:
+                getattr(namespace, name)
+            except Exception:
+                pass
+
+
+def handle_request(conn, namespace):
+    f = conn.makefile("rwb")
+    request = read_message(f)
+    if not request:
+        return
+
+    sys.stdout = StreamWriter(f, "stdout")
+    sys.stderr = StreamWriter(f, "stderr")
+    try:
+        result = evaluate(request["code"], namespace)
+    except SystemExit as e:
+        send_message(f, result=None, exit_code=e.code if isinstance(e.code, int) else 1)
+    except BaseException:
+        traceback.print_exc()
+        send_message(f, result=None, exit_code=1)
+    else:
+        send_message(f, result=None if result is None else str(result), exit_code=0)
+
+
+def serve(socket_path=SOCKET_PATH):
+    """run a server with a fully loaded `j`, every request is handled in a forked child
+
+    only the current user can connect to it, the socket is created in a private directory (if it does not exist)
+    and is only accessible by its owner.
+
+    Args:
+        socket_path (str, optional): unix socket path. Defaults to SOCKET_PATH.
+
+    Returns:
+        int: exit code, 1 if another server is already listening on `socket_path`
+    """
+    try:
+        connect(socket_path).close()
+    except OSError:
+        # no server is listening, remove the socket left by a server that did not exit cleanly (if any)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    else:
+        print(f"another jsng server is listening on {socket_path}", file=sys.stderr)
+        return 1
+
+    from jumpscale.god import j
+
+    preload(j)
+
+    os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # created with 0o600 permissions, no one else can connect to it at any time
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen(128)
+
+    # children are not waited for, let them be reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f"jsng server is listening on {socket_path}")
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    handle_request(conn, {"j": j})
+                finally:
+                    conn.close()
+                    os._exit(0)
+            conn.close()
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+
+def connect(socket_path=SOCKET_PATH):
+    """connect to a running server
+
+    Args:
+        socket_path (str, optional): unix socket path. Defaults to SOCKET_PATH.
+
+    Raises:
+        OSError: if no server is listening on `socket_path`
+
+    Returns:
+        socket.socket: connection
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        raise
+    return conn
+
+
+def run_remote(conn, code):
+    """run a snippet in a running server
+
+    Args:
+        conn (socket.socket): connection to the server, see `connect`
+        code (str): snippet
+
+    Returns:
+        int: exit code
+    """
+    with conn:
+        f = conn.makefile("rwb")
+        send_message(f, code=code)
+        while True:
+            message = read_message(f)
+            if message is None:
+                # server child died without sending a result
+                return 1
+            if "stdout" in message:
+                sys.stdout.write(message["stdout"])
+            elif "stderr" in message:
+                sys.stderr.write(message["stderr"])
+            else:
+                if message["result"] is not None:
+                    print(message["result"])
+                return message["exit_code"]
+
+
+def run_local(code):
+    from jumpscale.god import j
+
+    result = evaluate(code, {"j": j})
+    if result is not None:
+        print(result)
+    return 0
 
 
 def run():
-    os.makedirs(BASE_CONFIG_DIR, exist_ok=True)
+    os.makedirs(BASE_CONFIG_DIR, mode=0o700, exist_ok=True)
     pathlib.Path(HISTORY_FILENAME).touch()
-    if len(sys.argv) == 1:
+
+    parser = argparse.ArgumentParser(prog="jsng")
+    parser.add_argument("expression", nargs="?", help="expression to evaluate")
+    parser.add_argument("-c", dest="code", help="snippet to run in jsng server (or locally if no server is running)")
+    parser.add_argument("--server", action="store_true", help="run jsng server with a fully loaded j")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="server unix socket path")
+    args = parser.parse_args()
+
+    if args.server:
+        sys.exit(serve(args.socket))
+
+    if args.code is not None:
+        try:
+            conn = connect(args.socket)
+        except OSError:
+            sys.exit(run_local(args.code))
+        sys.exit(run_remote(conn, args.code))
+
+    from jumpscale.god import j
+
+    if args.expression is None:
+        from jumpscale.shell import ptconfig
+        from ptpython.repl import embed
+
         sys.exit(embed(globals(), locals(), configure=ptconfig, history_filename=HISTORY_FILENAME))
     else:
-        sys.exit(print(eval(sys.argv[1])))
+        sys.exit(print(eval(args.expression)))
@@ -20,7 +20,10 @@ project2/
 ```
 - we get all the paths of the `rootnamespace`
 - we get all the subnamespaces
-- we get all the inner packages and import all of them (lazily) or load them eagerly but just once.
+- we get all the inner packages and register them by name only, every package is imported on first access
+  (e.g. `j.clients.redis` imports `jumpscale.clients.redis` the first time it's used)
+- the discovered layout is cached in `config_root/modules_index.json` and validated using directory mtimes,
+  so the scan is only done again for paths that changed
 
 
 real example:
@@ -79,7 +82,8 @@ js-ext
 import collections
 import importlib
 import importlib.util
-from jumpscale.core.config import get_config
+from jumpscale.core.config import get_config, config_root
+import json
 import os
 import pkgutil
 import sys
@@ -122,6 +126,56 @@ class ExportAsSimpleNamespace(SimpleNamespace):
             return attr
 
 
+class LazyNamespace(SimpleNamespace):
+    """
+    a subnamespace (e.g. `j.clients`) built from the directory scan only
+
+    packages are imported on first attribute access, then cached as normal attributes,
+    so only the packages actually used get imported.
+    """
+
+    def __init__(self, name, packages):
+        """
+        Args:
+            name (str): subnamespace name, e.g. "clients"
+            packages (dict): package name -> full module name, e.g. {"redis": "jumpscale.clients.redis"}
+        """
+        super().__init__()
+        self.__name = name
+        self.__packages = packages
+
+    def __dir__(self):
+        packages = self.__dict__.get("_LazyNamespace__packages", {})
+        return sorted(set(packages).union(key for key in self.__dict__ if not key.startswith("_")))
+
+    def __repr__(self):
+        return f"LazyNamespace({self.__dict__.get('_LazyNamespace__name')})"
+
+    def __getattr__(self, name):
+        packages = self.__dict__.get("_LazyNamespace__packages", {})
+        if name not in packages:
+            raise AttributeError(f"Can't find attr {name}")
+
+        importedpkgstr = packages[name]
+        try:
+            m = importlib.import_module(importedpkgstr)
+        except Exception as e:
+            traceback.print_exception(*sys.exc_info())
+            print("[-] {} at {} ".format(e, importedpkgstr))
+            # do not try to import it again
+            packages.pop(name)
+            raise AttributeError(f"Can't find attr {name}") from e
+
+        if hasattr(m, "export_module_as"):
+            value = ExportedModule(m)
+            value.__doc__ = m.__doc__
+        else:
+            value = m
+
+        setattr(self, name, value)
+        return value
+
+
 def namespaceify(mapping):
     if isinstance(mapping, collections.Mapping) and not isinstance(mapping, ExportAsSimpleNamespace):
         for key, value in mapping.items():
@@ -130,46 +184,160 @@ def namespaceify(mapping):
     return mapping
 
 
-def loadjsmodules():
+MODULES_INDEX_VERSION = 3
+MODULES_INDEX_PATH = os.path.join(config_root, "modules_index.json")
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_namespace_path(jsnamespace):
+    """
+    scan a single path of `jumpscale` namespace (e.g. `js-ng/jumpscale` or `js-ext/jumpscale`)
+
+    Args:
+        jsnamespace (str): path of the root namespace
+
+    Returns:
+        dict: path index entry, with the mtimes needed to validate it later
+    """
+    namespaces = {}
+    # mtimes of all first level directories, even the ones without packages yet (they can get some later)
+    mtimes = {}
+    for rootbase in sorted(os.listdir(jsnamespace)):
+        root = os.path.join(jsnamespace, rootbase)
+        if rootbase == "__pycache__" or rootbase.startswith(".") or not os.path.isdir(root):
+            continue
+
+        mtimes[rootbase] = get_mtime(root)
+        packages = None
+        for pkgname in sorted(os.listdir(root)):
+            pkgpath = os.path.join(root, pkgname)
+            if pkgname == "__pycache__" or not os.path.isdir(pkgpath):
+                continue
+            if packages is None:
+                packages = {}
+            if "noload" in pkgname or pkgname.startswith("."):
+                continue
+            packages[pkgname] = {
+                "module": "jumpscale.{}.{}".format(rootbase, pkgname),
+                "path": pkgpath,
+            }
+
+        # only directories with packages are subnamespaces
+        if packages is not None:
+            namespaces[rootbase] = {"packages": packages}
+
+    return {"mtime": get_mtime(jsnamespace), "mtimes": mtimes, "namespaces": namespaces}
+
+
+def is_valid_path_index(jsnamespace, entry):
+    """
+    check if a cached path index entry is still up to date, using only `stat` calls
+
+    Args:
+        jsnamespace (str): path of the root namespace
+        entry (dict): cached entry as returned by `scan_namespace_path`
+
+    Returns:
+        bool: True if nothing changed since it was scanned
+    """
+    if get_mtime(jsnamespace) != entry["mtime"]:
+        return False
+
+    for rootbase, mtime in entry["mtimes"].items():
+        if get_mtime(os.path.join(jsnamespace, rootbase)) != mtime:
+            return False
+    return True
+
+
+def read_modules_index():
+    try:
+        with open(MODULES_INDEX_PATH) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(index, dict) or index.get("version") != MODULES_INDEX_VERSION:
+        return {}
+    return index.get("paths", {})
+
+
+def write_modules_index(paths):
+    # write then rename, so a concurrent start never reads a partial index
+    tmp_path = "{}.{}.tmp".format(MODULES_INDEX_PATH, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(MODULES_INDEX_PATH), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MODULES_INDEX_VERSION, "paths": paths}, f)
+        os.replace(tmp_path, MODULES_INDEX_PATH)
+    except OSError:
+        # cache is optional (e.g. read-only home directory)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_modules_index(use_cache=True):
+    """
+    get the layout of all paths of `jumpscale` namespace, every path is scanned only if it changed.
+
+    the index is cached at `MODULES_INDEX_PATH` and validated against directory mtimes,
+    so on a normal start, no directory walk is done.
+
+    Args:
+        use_cache (bool, optional): use the cached index if valid. Defaults to True.
+
+    Returns:
+        dict: path -> path index entry (see `scan_namespace_path`)
+    """
     import jumpscale
 
-    loadeddict = {"jumpscale": {}}
+    cached = read_modules_index() if use_cache else {}
+
+    paths = {}
+    changed = set(cached) != set(jumpscale.__path__)
     for jsnamespace in jumpscale.__path__:
-        for root, dirs, _ in os.walk(jsnamespace):
-            for d in dirs:
-                if d == "__pycache__":
-                    continue
-                if os.path.basename(root) == "jumpscale":
-                    continue
-
-                if os.path.dirname(root) != jsnamespace:
-                    continue
-                # print("root: {} d: {}".format(root, d))
-                rootbase = os.path.basename(root)
-                loadeddict["jumpscale"].setdefault(rootbase, {})
-                pkgname = d
-                if "noload" in pkgname or pkgname.startswith("."):
-                    continue
-                importedpkgstr = "jumpscale.{}.{}".format(rootbase, pkgname)
-                __all__.append(importedpkgstr)
-                # globals()[importedpkgstr] = lazy_import.lazy_module(importedpkgstr)
-                try:
-                    m = importlib.import_module(importedpkgstr)
-                except Exception as e:
-                    traceback.print_exception(*sys.exc_info())
-                    print("[-] {} at {} ".format(e, importedpkgstr))
-                    continue
-                else:
-                    if hasattr(m, "export_module_as"):
-                        # print("rootbase: ", rootbase, importedpkgstr)
-                        # print(m.export_module_as)
-                        expmod = ExportedModule(m)
-                        expmod.__doc__ = m.__doc__
-                        loadeddict["jumpscale"][rootbase][pkgname] = expmod
-                        # loadeddict[importedpkgstr] = m.export_module_as
-                    else:
-                        loadeddict["jumpscale"][rootbase][pkgname] = m
+        entry = cached.get(jsnamespace)
+        if entry is None or not is_valid_path_index(jsnamespace, entry):
+            entry = scan_namespace_path(jsnamespace)
+            changed = True
+        paths[jsnamespace] = entry
+
+    if changed:
+        write_modules_index(paths)
+    return paths
+
+
+def scanjsmodules(use_cache=True):
+    """
+    get all subnamespaces and their packages in all paths of `jumpscale` namespace, without importing any of them
+
+    Args:
+        use_cache (bool, optional): use the cached modules index if valid. Defaults to True.
 
+    Returns:
+        dict: subnamespace name -> {package name: full module name}
+    """
+    namespaces = {}
+    for entry in get_modules_index(use_cache=use_cache).values():
+        for rootbase, namespace in entry["namespaces"].items():
+            namespaces.setdefault(rootbase, {})
+            for pkgname, package in namespace["packages"].items():
+                importedpkgstr = package["module"]
+                if importedpkgstr not in __all__:
+                    __all__.append(importedpkgstr)
+                namespaces[rootbase][pkgname] = importedpkgstr
+
+    return namespaces
+
+
+def loadjsmodules():
+    namespaces = scanjsmodules()
+    loadeddict = {"jumpscale": {name: LazyNamespace(name, packages) for name, packages in namespaces.items()}}
     return namespaceify(loadeddict)
 
 
@@ -0,0 +1,18 @@
+"""Measures where js-ng startup time goes: config module side effects, `jumpscale.god` loading,
+importing every package of every subnamespace and running every `export_module_as()`.
+
+Measuring is done in a fresh python process, so already imported modules do not hide any costs.
+
+```
+JS-NG> records = j.tools.startupprofile.profile_startup()
+JS-NG> print(j.tools.startupprofile.format_records(records))
+```
+
+or from the command line
+
+```
+~> jsctl startup-profile --save /tmp/before.json
+~> jsctl startup-profile --compare /tmp/before.json
+```
+"""
+from .startupprofile import measure, profile_startup, format_records
@@ -0,0 +1,133 @@
+"""only standard library modules are imported here, anything else is imported while measuring"""
+import importlib
+import json
+import subprocess
+import sys
+import time
+
+
+def timed(records, kind, name, fun, *args, **kwargs):
+    """call `fun` and add a record of how long it took
+
+    Args:
+        records (list): records list to append the record to
+        kind (str): record kind, e.g. "import" or "export"
+        name (str): record name
+        fun (callable): function to call
+
+    Returns:
+        any: the return value of `fun`, or None if it failed
+    """
+    record = {"kind": kind, "name": name, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        return fun(*args, **kwargs)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        records.append(record)
+
+
+def measure():
+    """measure startup costs in the current process, must be called in a fresh process
+
+    packages that are already imported when their turn comes (e.g. `tools.errorhandler`, imported by `jumpscale.god`)
+    are reported with "preloaded" kind, as their import cost is included in the record of what imported them.
+
+    Returns:
+        list of dict: records with kind, name, seconds and error (if any)
+    """
+    records = []
+
+    timed(records, "config", "import jumpscale.core.config", importlib.import_module, "jumpscale.core.config")
+    config = importlib.import_module("jumpscale.core.config.config")
+    timed(records, "config", "get_config", config.get_config)
+    timed(records, "config", "migrate_config", config.migrate_config)
+
+    god = timed(records, "god", "import jumpscale.god", importlib.import_module, "jumpscale.god")
+    timed(records, "god", "modules index (cached)", god.get_modules_index)
+    timed(records, "god", "modules index (scan)", god.get_modules_index, use_cache=False)
+
+    for path_index in god.get_modules_index().values():
+        for namespace_name, namespace in path_index["namespaces"].items():
+            namespace_start = time.perf_counter()
+            for package_name, package in namespace["packages"].items():
+                name = f"{namespace_name}.{package_name}"
+                if package["module"] in sys.modules:
+                    # imported already (by jumpscale.god or another package), its cost is counted there
+                    records.append({"kind": "preloaded", "name": name, "seconds": 0.0, "error": None})
+                    module = sys.modules[package["module"]]
+                else:
+                    module = timed(records, "import", name, importlib.import_module, package["module"])
+                if module is not None and hasattr(module, "export_module_as"):
+                    timed(records, "export", name, module.export_module_as)
+            records.append(
+                {
+                    "kind": "subnamespace",
+                    "name": namespace_name,
+                    "seconds": time.perf_counter() - namespace_start,
+                    "error": None,
+                }
+            )
+
+    return records
+
+
+def profile_startup(python=None):
+    """measure startup costs in a new process
+
+    Args:
+        python (str, optional): python executable. Defaults to the current one.
+
+    Raises:
+        RuntimeError: if the measuring process failed
+
+    Returns:
+        list of dict: records with kind, name, seconds and error (if any)
+    """
+    python = python or sys.executable
+    process = subprocess.run(
+        [python, "-m", "jumpscale.tools.startupprofile"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if process.returncode:
+        raise RuntimeError(f"startup profiling failed: {process.stderr.decode()}")
+
+    # packages can print while being imported, the records are the last line
+    return json.loads(process.stdout.decode().strip().splitlines()[-1])
+
+
+def format_records(records, previous=None, limit=None):
+    """format records as a table sorted by time (slowest first)
+
+    Args:
+        records (list of dict): records as returned by `profile_startup`
+        previous (list of dict, optional): records of another run to compare with. Defaults to None.
+        limit (int, optional): maximum number of rows. Defaults to None (all).
+
+    Returns:
+        str: table
+    """
+    previous_seconds = {(r["kind"], r["name"]): r["seconds"] for r in previous or []}
+
+    header = ["kind", "name", "ms"]
+    if previous is not None:
+        header += ["previous ms", "diff ms"]
+    rows = [header]
+
+    for record in sorted(records, key=lambda r: r["seconds"], reverse=True)[:limit]:
+        ms = record["seconds"] * 1000
+        row = [record["kind"], record["name"], f"{ms:.2f}"]
+        if previous is not None:
+            key = (record["kind"], record["name"])
+            if key in previous_seconds:
+                previous_ms = previous_seconds[key] * 1000
+                row += [f"{previous_ms:.2f}", f"{ms - previous_ms:+.2f}"]
+            else:
+                row += ["-", "-"]
+        if record["error"]:
+            row[1] += f" ({record['error']})"
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from jumpscale.core import events
+from jumpscale.core.config import config
+
+
+class TestConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.tmp_dir, "config.toml")
+        with open(self.config_path, "w") as f:
+            f.write('store = "filesystem"\n')
+
+        patcher = mock.patch.object(config, "config_path", self.config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # start with an empty cache
+        for name in ("_cached_config", "_cached_signature"):
+            patcher = mock.patch.object(config, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.changes = []
+
+        def on_config_changed(ev):
+            self.changes.append(ev.config)
+
+        events.add_listenter(on_config_changed, config.ConfigChangedEvent)
+        self.addCleanup(events.remove_listener, on_config_changed, config.ConfigChangedEvent)
+
+    def test_config_is_loaded_once(self):
+        with mock.patch.object(config.toml, "load", wraps=config.toml.load) as load:
+            self.assertEqual(config.get_config()["store"], "filesystem")
+            self.assertEqual(config.get_config()["store"], "filesystem")
+            self.assertEqual(load.call_count, 1)
+
+        # no event on first load
+        self.assertEqual(self.changes, [])
+
+    def test_returned_config_is_a_copy(self):
+        data = config.get_config()
+        data["store"] = "redis"
+        self.assertEqual(config.get_config()["store"], "filesystem")
+
+    def test_update_config(self):
+        data = config.get_config()
+        data["store"] = "redis"
+        config.update_config(data)
+
+        self.assertEqual(config.get_config()["store"], "redis")
+        self.assertEqual(self.changes, [{"store": "redis"}])
+        # written using a temporary file that is renamed
+        self.assertEqual(os.listdir(self.tmp_dir), ["config.toml"])
+
+    def test_reload_if_changed_on_disk(self):
+        config.get_config()
+
+        with open(self.config_path, "w") as f:
+            f.write('store = "redis"\ndebug = true\n')
+
+        self.assertEqual(config.get_config()["store"], "redis")
+        self.assertEqual(len(self.changes), 1)
+
+    def test_migrate_config_writes_only_if_needed(self):
+        config.migrate_config()
+        self.assertIn("stores", config.get_config())
+        self.assertEqual(len(self.changes), 1)
+
+        config.migrate_config()
+        self.assertEqual(len(self.changes), 1)
+
+    def test_handlers_are_notified_without_the_cache_lock(self):
+        config.get_config()
+        acquired = []
+
+        def try_acquire():
+            if config._cache_lock.acquire(timeout=1):
+                config._cache_lock.release()
+                acquired.append(True)
+            else:
+                acquired.append(False)
+
+        def on_config_changed(ev):
+            # handlers may take other locks, another thread must be able to read the config meanwhile
+            thread = threading.Thread(target=try_acquire)
+            thread.start()
+            thread.join()
+
+        events.add_listenter(on_config_changed, config.ConfigChangedEvent)
+        self.addCleanup(events.remove_listener, on_config_changed, config.ConfigChangedEvent)
+
+        with open(self.config_path, "w") as f:
+            f.write('store = "redis"\n')
+        config.get_config()
+        config.update_config({"store": "filesystem"})
+
+        self.assertEqual(acquired, [True, True])
@@ -1,6 +1,8 @@
 """testing base with some fields, set/get,  validation and conversion from/to raw values"""
 
+import copy
 import enum
+import pickle
 import unittest
 
 from jumpscale.core.base import Base, fields, ValidationError
@@ -18,6 +20,10 @@ class User(Base):
     rating = fields.Float()
 
 
+class CompactUser(User):
+    _compact = True
+
+
 class Colors(enum.Enum):
     RED = "red"
     GREEN = "green"
@@ -75,3 +81,66 @@ class TestBaseWithFields(unittest.TestCase):
 
         with self.assertRaises(ValidationError):
             car.color = "xyz"
+
+    def test_data_to_and_from_raw(self):
+        user = User(id=1)
+        self.assertIsNot(user.emails, User().emails)
+
+        user.permissions = [Permission(is_admin=True)]
+        data = user.to_dict()
+        self.assertEqual(data["permissions"], [{"is_admin": True}])
+        self.assertEqual(user._get_data(names={"id"}), {"id": 1})
+
+        new_user = User()
+        new_user._set_data(data)
+        self.assertEqual(new_user.id, 1)
+        self.assertTrue(new_user.permissions[0].is_admin)
+
+    def test_overridden_get_data(self):
+        class Admin(User):
+            level = fields.Integer(default=1)
+
+            def _get_data(self, *args, **kwargs):
+                data = super()._get_data(*args, **kwargs)
+                data["admin"] = True
+                return data
+
+        data = Admin(id=2)._get_data()
+        self.assertEqual(data["level"], 1)
+        self.assertEqual(data["id"], 2)
+        self.assertTrue(data["admin"])
+
+    def test_compact_mode(self):
+        class CompactUser(User):
+            _compact = True
+
+        user = CompactUser(id=1)
+        self.assertEqual(user.__dict__, {})
+        self.assertEqual(user.emails, [])
+
+        user.permissions = [Permission(is_admin=True)]
+        self.assertEqual(user.permissions[0].is_admin, True)
+        self.assertEqual(user.to_dict(), User(id=1, permissions=[Permission(is_admin=True)]).to_dict())
+
+        other = CompactUser()
+        other._set_data(user.to_dict())
+        self.assertEqual(other, user)
+        other.rating = 1.5
+        self.assertNotEqual(other, user)
+
+    def test_compact_copy_and_pickle(self):
+        user = CompactUser(id=1, emails=["a@b.com"], permissions=[Permission(is_admin=True)], rating=2.5)
+
+        for other in (copy.copy(user), copy.deepcopy(user), pickle.loads(pickle.dumps(user))):
+            self.assertEqual(other, user)
+            self.assertEqual(other.id, 1)
+            self.assertEqual(other.emails, ["a@b.com"])
+            self.assertTrue(other.permissions[0].is_admin)
+            self.assertEqual(other.to_dict(), user.to_dict())
+
+        other = copy.deepcopy(user)
+        other.emails.append("c@d.com")
+        self.assertEqual(user.emails, ["a@b.com"])
+
+    def test_compact_repr(self):
+        self.assertEqual(repr(CompactUser(id=1)).replace("CompactUser", "User"), repr(User(id=1)))
@@ -0,0 +1,247 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import redis
+
+from jumpscale.core import events
+from jumpscale.data.serializers import base64, json
+from jumpscale.core.config import ConfigChangedEvent
+from jumpscale.core.base.store import (
+    FileSystemStore,
+    Location,
+    RedisStore,
+    SECRET_VALUE_TAG,
+    SQLiteStore,
+    get_store,
+    get_redis_connection_pool,
+    migrate_filesystem_to_sqlite,
+)
+
+
+class TestStore(unittest.TestCase):
+    def test_store_is_shared_per_location(self):
+        store = get_store(FileSystemStore, Location("tests", "store", "Shared"))
+        self.assertIs(store, get_store(FileSystemStore, Location("tests", "store", "Shared")))
+        self.assertIsNot(store, get_store(FileSystemStore, Location("tests", "store", "Other")))
+
+    def test_stores_invalidated_on_config_change(self):
+        location = Location("tests", "store", "Invalidated")
+        store = get_store(FileSystemStore, location)
+        pool = get_redis_connection_pool("localhost", 6379)
+
+        events.notify(ConfigChangedEvent({}))
+
+        self.assertIsNot(store, get_store(FileSystemStore, location))
+        self.assertIsNot(pool, get_redis_connection_pool("localhost", 6379))
+
+    def test_get_many(self):
+        store = get_store(FileSystemStore, Location("tests", "store", "GetMany"))
+        names = [f"instance{i}" for i in range(FileSystemStore.MIN_PARALLEL_READS * 2)]
+        for i, name in enumerate(names):
+            store.save(name, {"value": i, "__secret": f"secret{i}"})
+
+        try:
+            # parallel reads
+            configs = store.get_many(names + ["notfound"])
+            self.assertEqual(len(configs), len(names))
+            self.assertEqual(configs["instance3"], {"value": 3, "secret": "secret3"})
+
+            # sequential reads
+            configs = store.get_many(["instance1", "notfound"])
+            self.assertEqual(list(configs), ["instance1"])
+
+            self.assertEqual(store.get_all(), store.get_many(names))
+        finally:
+            for name in names:
+                store.delete(name)
+
+    def test_sqlite_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = SQLiteStore(Location("tests", "store", "SQLite"))
+            store.path = os.path.join(tmpdir, "configs.db")
+            child_store = SQLiteStore(Location("tests", "store", "SQLite", "instance1", "Child"))
+            child_store.path = store.path
+            sibling_store = SQLiteStore(Location("tests", "store", "SQLite", "instance10", "Child"))
+            sibling_store.path = store.path
+
+            store.save_many({f"instance{i}": {"value": i, "__secret": f"secret{i}"} for i in range(3)})
+            child_store.save("child", {"value": 1})
+            sibling_store.save("child", {"value": 10})
+
+            self.assertEqual(sorted(store.list_all()), ["instance0", "instance1", "instance2"])
+            self.assertEqual(store.get("instance2"), {"value": 2, "secret": "secret2"})
+            self.assertEqual(list(store.get_many(["instance0", "notfound"])), ["instance0"])
+            self.assertNotIn("secret1", store.read("instance1"))
+
+            store.update_field_index("instance0", {"value": 0})
+            store.update_field_index("instance2", {"value": 2})
+            self.assertEqual(store.find_in_field_index("value", 2), {"instance2"})
+            self.assertEqual(store.find_in_field_range("value", min=1), {"instance2"})
+
+            store.save_partial("instance0", {"__secret": "new", "other": [1]})
+            self.assertEqual(store.get("instance0"), {"value": 0, "secret": "new", "other": [1]})
+
+            # deleting an instance deletes its children too
+            store.delete("instance1")
+            store.delete("instance2")
+            self.assertEqual(store.list_all(), ["instance0"])
+            self.assertEqual(child_store.list_all(), [])
+            self.assertEqual(sibling_store.list_all(), ["child"])
+            self.assertEqual(store.find_in_field_range("value"), {"instance0"})
+
+    def test_migrate_filesystem_to_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fs_store = FileSystemStore(Location("tests", "store", "Migrated"))
+            fs_store.root = os.path.join(tmpdir, "secureconfig")
+            fs_store.save("instance", {"value": 1, "__secret": "secret"})
+            fs_store.update_field_index("instance", {"value": 1})
+
+            db_path = os.path.join(tmpdir, "configs.db")
+            self.assertEqual(migrate_filesystem_to_sqlite(fs_store.root, db_path), 1)
+
+            store = SQLiteStore(Location("tests", "store", "Migrated"))
+            store.path = db_path
+            self.assertEqual(store.get_all(), {"instance": {"value": 1, "secret": "secret"}})
+            self.assertEqual(store.find_in_field_index("value", 1), {"instance"})
+
+    def test_field_index_updated_by_many_processes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            location = Location("tests", "store", "ConcurrentIndex")
+
+            def update_index(process_number):
+                store = FileSystemStore(location)
+                store.root = tmpdir
+                for i in range(20):
+                    store.update_field_index(f"instance{process_number}_{i}", {"value": i})
+
+            context = multiprocessing.get_context("fork")
+            processes = [context.Process(target=update_index, args=(number,)) for number in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                self.assertEqual(process.exitcode, 0)
+
+            store = FileSystemStore(location)
+            store.root = tmpdir
+            self.assertEqual(len(store.find_in_field_range("value")), 80)
+            self.assertEqual(store.list_all(), [])
+
+    def test_secret_values(self):
+        store = get_store(FileSystemStore, Location("tests", "store", "Secrets"))
+        try:
+            store.save("instance", {"value": 1, "__secret": "secret", "nested": {"__token": "token"}})
+            data = json.loads(store.read("instance"))
+            self.assertTrue(data["__secret"].startswith(SECRET_VALUE_TAG))
+            self.assertTrue(data["nested"]["__token"].startswith(SECRET_VALUE_TAG))
+            self.assertEqual(store.get("instance"), {"value": 1, "secret": "secret", "nested": {"token": "token"}})
+
+            # values encrypted using public key encryption can still be decrypted
+            legacy = base64.encode(store.nacl.encrypt(b"legacy", store.public_key)).decode()
+            store.write("instance", json.dumps({"__secret": legacy}))
+            self.assertEqual(store.get("instance"), {"secret": "legacy"})
+        finally:
+            store.delete("instance")
+
+
+class TestRedisStore(unittest.TestCase):
+    def setUp(self):
+        self.store = RedisStore(Location("tests", "store", "Redis"))
+        self.redis_client = self.store.redis_client
+        try:
+            self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("redis server is not running")
+
+    def tearDown(self):
+        keys = list(self.redis_client.scan_iter(match="tests.store.Redis*"))
+        if keys:
+            self.redis_client.delete(*keys)
+        for key in ("tests:locations", "tests.store:locations"):
+            locations = [name for name in self.redis_client.smembers(key) if name.startswith(b"tests.store.Redis")]
+            if locations:
+                self.redis_client.srem(key, *locations)
+
+    def test_names_set(self):
+        self.store.save_many({"a": {"value": 1}, "ab": {"value": 2}})
+        self.assertEqual(self.redis_client.smembers("tests.store.Redis:names"), {b"a", b"ab"})
+
+        with mock.patch.object(self.redis_client, "scan_iter") as scan_iter:
+            self.assertEqual(sorted(RedisStore(self.store.location).list_all()), ["a", "ab"])
+            scan_iter.assert_not_called()
+
+    def test_delete_sub_locations(self):
+        child_store = RedisStore(Location("tests", "store", "Redis", "a", "children", "Child"))
+        self.store.save_many({"a": {"value": 1}, "ab": {"value": 2}})
+        child_store.save("child", {"value": 1})
+        child_store.update_field_index("child", {"value": 1})
+        sibling_store = RedisStore(Location("tests", "store", "Redis", "ab", "children", "Child"))
+        sibling_store.save("child", {"value": 2})
+
+        with mock.patch.object(self.redis_client, "scan_iter") as scan_iter:
+            self.store.delete("a")
+            scan_iter.assert_not_called()
+
+        self.assertEqual(self.store.list_all(), ["ab"])
+        # deleting "a" must not delete "ab" or its children
+        self.assertEqual(sibling_store.list_all(), ["child"])
+        keys = sorted(key.decode() for key in self.redis_client.scan_iter(match="tests.store.Redis.a*"))
+        self.assertTrue(keys)
+        self.assertTrue(all(key.startswith("tests.store.Redis.ab") for key in keys), keys)
+
+        # written again by the same store after it was deleted with its parent
+        self.store.save("a", {"value": 1})
+        child_store.save("child", {"value": 1})
+        self.store.delete("a")
+        self.assertEqual(child_store.list_all(), [])
+
+    def test_build_index_of_existing_keys(self):
+        # written before names and locations sets existed
+        self.redis_client.set("tests.store.Redis.a", json.dumps({"value": 1}))
+        self.redis_client.set("tests.store.Redis.ab", json.dumps({"value": 2}))
+        self.redis_client.set("tests.store.Redis.a.children.Child.child", json.dumps({"value": 3}))
+        self.redis_client.hset("tests.store.Redis.a.children.Child:index:value", "child", "3")
+        self.redis_client.sadd("tests.store.Redis.a.children.Child:index:value:3", "child")
+
+        self.assertEqual(sorted(self.store.list_all()), ["a", "ab"])
+        child_store = RedisStore(Location("tests", "store", "Redis", "a", "children", "Child"))
+        with mock.patch.object(self.redis_client, "scan_iter") as scan_iter:
+            self.assertEqual(child_store.list_all(), ["child"])
+            self.assertEqual(child_store.get("child"), {"value": 3})
+            scan_iter.assert_not_called()
+
+        self.store.delete("a")
+        keys = [key.decode() for key in self.redis_client.scan_iter(match="tests.store.Redis.a*")]
+        self.assertEqual(keys, ["tests.store.Redis.ab"])
+
+    def test_instances_are_stored_as_hashes(self):
+        self.store.save("a", {"value": 1, "__secret": "secret", "items": [1, 2]})
+        key = "tests.store.Redis.a"
+        self.assertEqual(self.redis_client.type(key), b"hash")
+        self.assertEqual(self.redis_client.hget(key, "value"), b"1")
+        self.assertEqual(self.store.get("a"), {"value": 1, "secret": "secret", "items": [1, 2]})
+
+        # only given fields are written
+        with mock.patch.object(self.store, "write_many", wraps=self.store.write_many) as write_many:
+            self.store.save_partial("a", {"value": 2, "__secret": "new"})
+            write_many.assert_not_called()
+        self.assertEqual(self.store.get("a"), {"value": 2, "secret": "new", "items": [1, 2]})
+
+        # a hash cannot be empty
+        self.store.save("empty", {})
+        self.assertEqual(self.store.get("empty"), {})
+
+    def test_read_and_update_string_values(self):
+        # written before instances were stored as hashes
+        self.redis_client.set("tests.store.Redis.a", json.dumps({"value": 1, "items": [1]}))
+        self.redis_client.set("tests.store.Redis.b", json.dumps({"value": 2}))
+
+        configs = self.store.get_many(["a", "b", "notfound"])
+        self.assertEqual(configs, {"a": {"value": 1, "items": [1]}, "b": {"value": 2}})
+
+        self.store.save_partial("a", {"value": 3})
+        self.assertEqual(self.redis_client.type("tests.store.Redis.a"), b"hash")
+        self.assertEqual(self.store.get("a"), {"value": 3, "items": [1]})
@@ -1,9 +1,13 @@
 from enum import Enum
+import io
 import unittest
+from unittest import mock
 
 
 # TODO: move fields to fields or types module
 from jumpscale.core.base import Base, Factory, StoredFactory, DuplicateError, fields
+from jumpscale.core.base.factory import write_behind
+from jumpscale.data.serializers import json
 
 
 class Address(Base):
@@ -42,6 +46,20 @@ class Client(Base):
     users = fields.Factory(User)
 
 
+class Member(Base):
+    email = fields.Email(indexed=True)
+    age = fields.Integer(indexed=True)
+    joined = fields.DateTime(indexed=True)
+    role = fields.Enum(UserType, indexed=True)
+
+
+class CompactClient(Base):
+    _compact = True
+
+    users = fields.Factory(User)
+    token = fields.Secret()
+
+
 class TestStoredFactory(unittest.TestCase):
     def setUp(self):
         self.factory = StoredFactory(Client)
@@ -73,6 +91,27 @@ class TestStoredFactory(unittest.TestCase):
         user = cl.users.get("user_with_password")
         self.assertEqual(user.password, "test124")
 
+    def test_secrets_are_decrypted_on_access(self):
+        cl = self.factory.get("test_lazy_secret")
+        user = cl.users.get("auser")
+        user.password = "pass"
+        user.save()
+        ciphertext = json.loads(cl.users.store.read("auser"))["__password"]
+
+        self.factory = StoredFactory(Client)
+        cl = self.factory.get("test_lazy_secret")
+        user = cl.users.get("auser")
+        with mock.patch.object(cl.users.store, "_decrypt_value", wraps=cl.users.store._decrypt_value) as decrypt:
+            user.type = UserType.ADMIN
+            user.save()
+            self.assertEqual(decrypt.call_count, 0)
+            # saved as is
+            self.assertEqual(json.loads(cl.users.store.read("auser"))["__password"], ciphertext)
+
+            self.assertEqual(user.password, "pass")
+            self.assertEqual(user.password, "pass")
+            self.assertEqual(decrypt.call_count, 1)
+
     def test_create_stored_factory(self):
         cl = self.factory.get("client")
         w = cl.wallets.get("aa")
@@ -140,6 +179,233 @@ class TestStoredFactory(unittest.TestCase):
         user = ret_cl.users.get("admin")
         self.assertEqual(user.type, UserType.ADMIN)
 
+    def test_instances_are_materialized_on_access(self):
+        for name in ("lazy1", "lazy2", "lazy3"):
+            self.factory.get(name).save()
+
+        self.factory = StoredFactory(Client)
+        self.assertEqual(self.factory.count, 3)
+        self.assertEqual(self.factory.list_all(), {"lazy1", "lazy2", "lazy3"})
+        self.assertEqual(self.factory.list_all(loaded_only=True), set())
+
+        cl = self.factory.find("lazy1")
+        self.assertIsInstance(cl, Client)
+        self.assertIs(self.factory.lazy1, cl)
+        self.assertEqual(self.factory.list_all(loaded_only=True), {"lazy1"})
+
+        # cannot create a new instance with a stored name, even if it's not materialized
+        with self.assertRaises(DuplicateError):
+            self.factory.new("lazy2")
+
+        self.factory.delete("lazy3")
+        self.assertIsNone(self.factory.find("lazy3"))
+        self.assertEqual(self.factory.count, 2)
+
+        self.assertEqual({cl.instance_name for cl in self.factory}, {"lazy1", "lazy2"})
+        self.assertEqual(self.factory.count, 2)
+
+    def test_updates_are_saved(self):
+        cl = self.factory.get("test_autosave")
+        user = cl.users.get("auser")
+        cl.save()
+
+        user.emails = ["a@b.com"]
+
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_autosave").users.get("auser")
+        self.assertEqual(user.emails, ["a@b.com"])
+
+    def test_batch_saves_once(self):
+        cl = self.factory.get("test_batch")
+        user = cl.users.get("auser")
+        cl.save()
+
+        with mock.patch.object(cl.users.store, "write", wraps=cl.users.store.write) as write:
+            with user.batch():
+                user.emails = ["a@b.com"]
+                user.type = UserType.ADMIN
+                user.password = "pass"
+                self.assertEqual(write.call_count, 0)
+            self.assertEqual(write.call_count, 1)
+
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_batch").users.get("auser")
+        self.assertEqual(user.type, UserType.ADMIN)
+        self.assertEqual(user.password, "pass")
+
+    def test_only_changed_fields_are_saved(self):
+        cl = self.factory.get("test_dirty")
+        cl.save()
+        user = cl.users.get("auser")
+        self.assertIsNone(user._get_dirty_fields())
+        user.emails = ["a@b.com"]
+        user.save()
+        self.assertEqual(user._get_dirty_fields(), set())
+
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_dirty").users.get("auser")
+        self.assertEqual(user._get_dirty_fields(), set())
+
+        store = self.factory.test_dirty.users.store
+        with mock.patch.object(store, "update", wraps=store.update) as update:
+            with user.batch():
+                user.type = UserType.ADMIN
+                user.password = "pass"
+                self.assertEqual(user._get_dirty_fields(), {"type", "password"})
+            update.assert_called_once()
+            self.assertEqual(set(update.call_args[0][1]), {"type", "__password"})
+        self.assertEqual(user._get_dirty_fields(), set())
+
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_dirty").users.get("auser")
+        self.assertEqual(user.emails, ["a@b.com"])
+        self.assertEqual(user.type, UserType.ADMIN)
+        self.assertEqual(user.password, "pass")
+
+    def test_fields_set_while_saving_stay_changed(self):
+        cl = self.factory.get("test_dirty_while_saving")
+        cl.save()
+        user = cl.users.get("auser")
+        user.save()
+        store = cl.users.store
+
+        def set_while_saving(*args, **kwargs):
+            # e.g. set by another thread while saving in write-behind mode
+            user.type = UserType.ADMIN
+
+        with mock.patch.object(store, "update", side_effect=set_while_saving):
+            user.emails = ["a@b.com"]
+            self.assertEqual(user._get_dirty_fields(), {"type"})
+
+        # failed saves on updates are ignored, changed fields are saved next time
+        with mock.patch.object(store, "update", side_effect=OSError):
+            user.emails = ["c@d.com"]
+            self.assertEqual(user._get_dirty_fields(), {"type", "emails"})
+
+        user.save()
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_dirty_while_saving").users.get("auser")
+        self.assertEqual(user.type, UserType.ADMIN)
+        self.assertEqual(user.emails, ["c@d.com"])
+
+    def test_compact_instances(self):
+        clients = StoredFactory(CompactClient)
+        try:
+            cl = clients.get("compact", token="secret")
+            cl.users.get("auser", emails=["a@b.com"]).save()
+            cl.save()
+
+            clients = StoredFactory(CompactClient)
+            cl = clients.get("compact")
+            self.assertEqual(cl.instance_name, "compact")
+            self.assertEqual(cl.token, "secret")
+            self.assertEqual(cl.users.get("auser").emails, ["a@b.com"])
+        finally:
+            for name in clients.store.list_all():
+                clients.delete(name)
+
+    def test_write_behind(self):
+        cl = self.factory.get("test_write_behind")
+        cl.save()
+        self.factory.set_write_behind(60)
+        user = cl.users.get("auser")
+
+        with mock.patch.object(cl.users.store, "write", wraps=cl.users.store.write) as write:
+            user.emails = ["a@b.com"]
+            user.type = UserType.ADMIN
+            self.assertEqual(write.call_count, 0)
+
+            write_behind.flush()
+            self.assertEqual(write.call_count, 1)
+
+        self.factory.set_write_behind(None)
+        self.factory = StoredFactory(Client)
+        user = self.factory.get("test_write_behind").users.get("auser")
+        self.assertEqual(user.emails, ["a@b.com"])
+        self.assertEqual(user.type, UserType.ADMIN)
+
+    def test_find_by_indexed_fields(self):
+        members = StoredFactory(Member)
+        try:
+            for name, age in (("m1", 20), ("m2", 30), ("m3", 40)):
+                member = members.get(name, email=f"{name}@b.com", age=age, role=UserType.USER)
+                member.joined = f"2020-01-0{age // 10} 00:00"
+                member.save()
+
+            members.m3.role = UserType.ADMIN
+            members.delete("m1")
+
+            members = StoredFactory(Member)
+            self.assertEqual([m.instance_name for m in members.find_by(email="m2@b.com")], ["m2"])
+            self.assertEqual([m.instance_name for m in members.find_by(role=UserType.USER)], ["m2"])
+            self.assertEqual([m.instance_name for m in members.find_by(role="admin", age=40)], ["m3"])
+            self.assertEqual(members.find_by(email="m1@b.com"), [])
+            self.assertEqual(members.list_all(loaded_only=True), {"m2", "m3"})
+
+            self.assertEqual([m.instance_name for m in members.find_range("age", min=25)], ["m2", "m3"])
+            self.assertEqual([m.instance_name for m in members.find_range("age", max=30)], ["m2"])
+            self.assertEqual([m.instance_name for m in members.find_range("joined", max="2020-01-03 00:00")], ["m2"])
+
+            members.store.clear_field_index(["age"])
+            self.assertEqual(members.find_range("age"), [])
+            members.rebuild_index()
+            self.assertEqual([m.instance_name for m in members.find_range("age")], ["m2", "m3"])
+
+            with self.assertRaises(ValueError):
+                members.find_by(name="m2")
+        finally:
+            for name in members.store.list_all():
+                members.delete(name)
+
+    def test_export_and_import(self):
+        cl = self.factory.get("test_export")
+        user = cl.users.get("auser", emails=["a@b.com"], type=UserType.ADMIN)
+        user.password = "pass"
+        user.save()
+        address = cl.wallets.get("awallet", ID=1).addresses.get("home")
+        address.x = 10
+        address.save()
+        cl.wallets.awallet.save()
+        cl.save()
+        ciphertext = json.loads(cl.users.store.read("auser"))["__password"]
+
+        for format_, compress in (("msgpack", True), ("jsonl", False)):
+            stream = io.BytesIO()
+            self.assertEqual(self.factory.export(stream, format_=format_, compress=compress), 4)
+
+            self.factory.delete("test_export")
+            self.factory = StoredFactory(Client)
+            self.assertEqual(self.factory.count, 0)
+
+            stream.seek(0)
+            self.assertEqual(self.factory.import_(stream), 4)
+            cl = self.factory.get("test_export")
+            user = cl.users.get("auser")
+            # secrets are exported encrypted
+            self.assertEqual(json.loads(cl.users.store.read("auser"))["__password"], ciphertext)
+            self.assertEqual(user.password, "pass")
+            self.assertEqual(user.emails, ["a@b.com"])
+            self.assertEqual(user.type, UserType.ADMIN)
+            self.assertEqual(cl.wallets.awallet.ID, 1)
+            self.assertEqual(cl.wallets.awallet.addresses.home.x, 10)
+
+    def test_import_updates_indexes(self):
+        members = StoredFactory(Member)
+        try:
+            members.get("m1", email="m1@b.com", age=20).save()
+            stream = io.BytesIO()
+            members.export(stream)
+            members.delete("m1")
+
+            stream.seek(0)
+            members = StoredFactory(Member)
+            members.import_(stream)
+            self.assertEqual([m.instance_name for m in members.find_by(email="m1@b.com")], ["m1"])
+            self.assertEqual([m.instance_name for m in members.find_range("age", min=10)], ["m1"])
+        finally:
+            for name in members.store.list_all():
+                members.delete(name)
+
     def tearDown(self):
         for name in self.factory.store.list_all():
             self.factory.delete(name)
@@ -1,5 +1,7 @@
+import threading
 import unittest
 from collections import defaultdict
+from unittest import mock
 
 from jumpscale.core import events
 
@@ -22,9 +24,9 @@ class UserThirstyEvent:
 
 class TestEvents(unittest.TestCase):
     def setUp(self):
-        events.listeners[events.Any].clear()
-        events.listeners[UserHungryEvent].clear()
-        events.listeners[UserThirstyEvent].clear()
+        for event_type in (events.Any, UserHungryEvent, UserThirstyEvent):
+            for listener in list(events.listeners[event_type]):
+                events.remove_listener(listener, event_type)
 
     def test_notify_handle_decorators(self):
         notified = defaultdict(list)
@@ -92,3 +94,144 @@ class TestEvents(unittest.TestCase):
 
         # handler should be found for the other event too (any)
         self.assertIn(handler, notified.get(UserThirstyEvent, []))
+
+    def test_notify_subclass_events(self):
+        notified = []
+
+        class VeryHungryEvent(UserHungryEvent):
+            pass
+
+        def handle_hungry(ev):
+            notified.append(ev)
+
+        events.add_listenter(handle_hungry, UserHungryEvent)
+        events.notify(UserHungryEvent("ahmed"))
+        events.notify(VeryHungryEvent("dmdm"))
+        self.assertEqual([ev.name for ev in notified], ["ahmed", "dmdm"])
+
+        events.remove_listener(handle_hungry)
+        events.notify(UserHungryEvent("ahmed"))
+        self.assertEqual(len(notified), 2)
+
+    def test_notify_target(self):
+        notified = []
+
+        class Target:
+            pass
+
+        target, other = Target(), Target()
+
+        def handle_hungry(ev):
+            notified.append(ev.name)
+
+        events.add_listenter(handle_hungry, UserHungryEvent, target=target)
+
+        for name, ev_target in (("target", target), ("other", other), ("none", None)):
+            ev = UserHungryEvent(name)
+            ev.target = ev_target
+            events.notify(ev)
+
+        self.assertEqual(notified, ["target"])
+
+    def test_handlers_are_weakly_referenced(self):
+        notified = []
+
+        class TestHandler(events.Handler):
+            def handle(self, ev):
+                notified.append(ev)
+
+        handler = TestHandler()
+        events.add_listenter(handler, UserHungryEvent, weak=True)
+        events.notify(UserHungryEvent("ahmed"))
+        self.assertEqual(len(notified), 1)
+
+        del handler
+        self.assertEqual(events.listeners[UserHungryEvent], [])
+        events.notify(UserHungryEvent("ahmed"))
+        self.assertEqual(len(notified), 1)
+
+    def test_handlers_are_strongly_referenced_by_default(self):
+        notified = []
+
+        class TestHandler(events.Handler):
+            def handle(self, ev):
+                notified.append(ev)
+
+        events.add_listenter(TestHandler(), UserHungryEvent)
+        events.notify(UserHungryEvent("ahmed"))
+        self.assertEqual(len(notified), 1)
+
+    def test_thread_delivery(self):
+        main_thread = threading.current_thread()
+        notified = []
+
+        def handle_hungry(ev):
+            notified.append((ev.name, threading.current_thread()))
+
+        events.add_listenter(handle_hungry, UserHungryEvent, delivery=events.THREAD)
+        events.notify(UserHungryEvent("ahmed"))
+        events.notify(UserHungryEvent("dmdm"))
+        events.flush()
+
+        self.assertEqual([name for name, _ in notified], ["ahmed", "dmdm"])
+        self.assertNotIn(main_thread, [thread for _, thread in notified])
+
+    def test_thread_handler_notifies_with_full_queue(self):
+        notified = []
+
+        def handle_hungry(ev):
+            # queue is full (of thirsty events), the worker must not wait for itself
+            for name in ("a", "b", "c"):
+                events.notify(UserThirstyEvent(name))
+
+        def handle_thirsty(ev):
+            notified.append(ev.name)
+
+        with mock.patch.object(events, "QUEUE_SIZE", 1), mock.patch.dict(events.dispatchers, clear=True):
+            events.add_listenter(handle_hungry, UserHungryEvent, delivery=events.THREAD)
+            events.add_listenter(handle_thirsty, UserThirstyEvent, delivery=events.THREAD)
+            events.notify(UserHungryEvent("ahmed"))
+
+            dispatcher = events.get_dispatcher(events.THREAD)
+            thread = threading.Thread(target=dispatcher.flush, daemon=True)
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+        self.assertEqual(sorted(notified), ["a", "b", "c"])
+
+    def test_notify_async(self):
+        notified = []
+        handled = threading.Event()
+
+        @events.handle(UserThirstyEvent)
+        def handle_thirsty(ev):
+            handled.wait(5)
+            notified.append(ev.name)
+
+        # returns before the handler is done
+        events.notify_async(UserThirstyEvent("ahmed"))
+        self.assertEqual(notified, [])
+
+        handled.set()
+        events.flush()
+        self.assertEqual(notified, ["ahmed"])
+
+    def test_batch_delivery(self):
+        batches = []
+
+        class BatchHandler(events.Handler):
+            def handle_batch(self, evs):
+                batches.append([ev.name for ev in evs])
+
+        handler = BatchHandler()
+        events.add_listenter(handler, UserHungryEvent, batch=True)
+        events.notify(UserHungryEvent("ahmed"))
+        self.assertEqual(batches, [["ahmed"]])
+
+        events.remove_listener(handler)
+        events.add_listenter(handler, UserHungryEvent, batch=True, delivery=events.GEVENT)
+        for name in ("a", "b", "c"):
+            events.notify(UserHungryEvent(name))
+        events.flush()
+        self.assertEqual(batches, [["ahmed"], ["a", "b", "c"]])
@@ -0,0 +1,212 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import redis
+
+from jumpscale.core.base.store import close_sqlite_connection
+from jumpscale.data.bcdb.bcdb import BCDB
+
+
+class TestBCDB(unittest.TestCase):
+    NAMESPACE = "bcdbtest"
+
+    def setUp(self):
+        self.redis_client = redis.Redis()
+        try:
+            self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("redis server is not running")
+        self.clear_keys()
+
+        # the sqlite index is created in the current directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+
+        self.bcdb = BCDB(self.NAMESPACE)
+        self.employees = self.bcdb.get_model_by_name("employee")
+
+    def tearDown(self):
+        close_sqlite_connection(self.bcdb.indexer_set.path)
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+        self.clear_keys()
+
+    def clear_keys(self):
+        keys = list(self.redis_client.scan_iter(match=f"{self.NAMESPACE}.*"))
+        if keys:
+            self.redis_client.delete(*keys)
+
+    def test_sqlite_connection_per_thread(self):
+        indexer_set = self.bcdb.indexer_set
+        connection = indexer_set.connection
+        self.assertIs(connection, indexer_set.connection)
+        self.assertIs(connection, self.bcdb.indexer_text.connection)
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(indexer_set.connection))
+        thread.start()
+        thread.join()
+        self.assertIsNot(connections[0], connection)
+
+    def test_sqlite_index_set(self):
+        employees = self.employees.create_many([{"name": f"e{i}", "salary": i * 100} for i in range(5)])
+        self.bcdb.indexer_set.set_many(self.employees, employees)
+        self.assertIn("employee", self.bcdb.indexer_set._tables)
+
+        self.assertEqual(sorted(x[0] for x in self.bcdb.indexer_set.get(self.employees, "salary", 100, 300)), [2, 3, 4])
+
+        # replaced
+        employees[1].salary = 1000
+        self.bcdb.indexer_set.set(self.employees, employees[1])
+        self.assertEqual(sorted(x[0] for x in self.bcdb.indexer_set.get(self.employees, "salary", 100, 300)), [3, 4])
+
+    def test_save_obj(self):
+        employee = self.employees.create_obj({"name": "ahmed", "age": 30, "salary": 1000})
+        with mock.patch.object(self.bcdb, "get_item_by_id", wraps=self.bcdb.get_item_by_id) as get_item_by_id:
+            employee.save()
+            # previous version is fetched once, not once per property
+            self.assertEqual(get_item_by_id.call_count, 1)
+
+        self.assertEqual(self.employees.get_by("name", "ahmed").age, 30)
+        self.assertEqual(self.bcdb.indexer.get(self.employees, "id", employee.id), employee.id)
+
+        # old index values are removed
+        employee.name = "omar"
+        employee.save()
+        self.assertIsNone(self.bcdb.indexer.get(self.employees, "name", "ahmed"))
+        self.assertEqual(self.employees.get_by("name", "omar").id, employee.id)
+
+    def test_save_obj_is_atomic(self):
+        employee = self.employees.create_obj({"name": "ahmed"})
+        employee.save()
+
+        employee.name = "omar"
+        with mock.patch.object(self.bcdb.storage, "set", side_effect=RuntimeError("died")):
+            with self.assertRaises(RuntimeError):
+                employee.save()
+
+        # neither the index nor the storage is changed
+        self.assertEqual(self.bcdb.indexer.get(self.employees, "name", "ahmed"), employee.id)
+        self.assertIsNone(self.bcdb.indexer.get(self.employees, "name", "omar"))
+        self.assertEqual(self.bcdb.get_item_by_id(self.employees, employee.id).name, "ahmed")
+
+    def test_create_and_save_many(self):
+        first = self.employees.create_obj({"name": "first"})
+        with mock.patch.object(self.bcdb.storage, "incr_id", wraps=self.bcdb.storage.incr_id) as incr_id:
+            employees = self.employees.create_many([{"name": f"e{i}", "age": i, "salary": i * 100} for i in range(5)])
+            # one block of ids
+            incr_id.assert_called_once_with(self.employees, 5)
+        self.assertEqual([e.id for e in employees], list(range(first.id + 1, first.id + 6)))
+
+        self.employees.save_many(employees)
+        found = self.employees.get_many([employees[3].id, 1000, employees[0].id])
+        self.assertEqual([e.name if e else None for e in found], ["e3", None, "e0"])
+        self.assertEqual(self.employees.get_by("name", "e2").id, employees[2].id)
+        self.assertEqual(sorted(e.name for e in self.employees.get_range("salary", 100, 200)), ["e1", "e2"])
+
+        # updated in bulk too
+        employees[0].name = "changed"
+        self.bcdb.save_many(self.employees, employees, batch_size=2)
+        self.assertIsNone(self.employees.get_by("name", "e0"))
+        self.assertEqual(self.employees.get_by("name", "changed").id, employees[0].id)
+
+    def test_save_many_checks_uniqueness(self):
+        self.employees.create_obj({"name": "taken"}).save()
+
+        with self.assertRaises(RuntimeError):
+            self.employees.save_many(self.employees.create_many([{"name": "taken"}]))
+        with self.assertRaises(RuntimeError):
+            self.employees.save_many(self.employees.create_many([{"name": "twice"}, {"name": "twice"}]))
+        self.assertIsNone(self.employees.get_by("name", "twice"))
+
+    def test_iter_model(self):
+        self.employees.save_many(self.employees.create_many([{"name": f"e{i}", "age": i} for i in range(10)]))
+
+        storage_client = self.bcdb.storage.redis_client
+        with mock.patch.object(storage_client, "mget", wraps=storage_client.mget) as mget:
+            objs = self.bcdb.storage.iter_model(self.employees, count=2, batch_size=3)
+            # lazy
+            mget.assert_not_called()
+            self.assertEqual(sorted(obj.age for obj in objs), list(range(10)))
+            self.assertEqual(mget.call_count, 4)
+        self.assertEqual(len(self.bcdb.storage.get_keys_in_model(self.employees)), 10)
+
+    def test_get_entry_stops_at_first_match(self):
+        self.employees.save_many(self.employees.create_many([{"name": f"e{i}", "age": 1} for i in range(10)]))
+
+        serializer = self.bcdb.storage.serializer
+        with mock.patch.object(serializer, "loads", wraps=serializer.loads) as loads:
+            self.assertEqual(self.employees.get_by("age", 1).age, 1)
+            self.assertEqual(loads.call_count, 1)
+        self.assertIsNone(self.employees.get_by("age", 2))
+
+    def test_get_range(self):
+        self.employees.save_many(
+            self.employees.create_many([{"name": f"e{i}", "age": i, "salary": i * 100} for i in range(5)])
+        )
+
+        with mock.patch.object(self.bcdb.storage, "iter_model", wraps=self.bcdb.storage.iter_model) as iter_model:
+            # indexed for range search
+            self.assertEqual(sorted(e.name for e in self.employees.get_range("salary", 100, 200)), ["e1", "e2"])
+            iter_model.assert_not_called()
+
+            # not indexed, objects are scanned
+            self.assertEqual(sorted(e.name for e in self.employees.get_range("age", 3, 10)), ["e3", "e4"])
+            iter_model.assert_called_once()
+
+        with self.assertRaises(RuntimeError):
+            self.employees.get_range("notfound", 1, 2)
+
+    def test_text_index(self):
+        quotes = self.bcdb.get_model_by_name("quote")
+        texts = [
+            "Learning never exhausts the mind.",
+            "Happiness can exist only in acceptance.",
+            "The mind, the mind and learning",
+        ]
+        objs = quotes.create_many([{"author": f"a{i}", "quote": text} for i, text in enumerate(texts)])
+        quotes.save_many(objs)
+
+        def search(pattern):
+            return [obj.id for obj in quotes.get_pattern("quote", pattern)]
+
+        ids = [obj.id for obj in objs]
+        # ranked by relevance
+        self.assertEqual(search("mind"), [ids[2], ids[0]])
+        self.assertEqual(sorted(search("learn*")), [ids[0], ids[2]])
+        self.assertEqual(search("happi* accept*"), [ids[1]])
+        self.assertEqual(search('"never exhausts"'), [ids[0]])
+        self.assertEqual(search('"exhausts never"'), [])
+        self.assertEqual(search(""), [])
+
+        # re-indexed on updates
+        objs[0].quote = "changed text"
+        objs[0].save()
+        self.assertEqual(search("mind"), [ids[2]])
+        self.assertEqual(search("changed"), [ids[0]])
+
+        self.bcdb.indexer_text.delete(quotes, [ids[0], ids[2]])
+        self.assertEqual(search("changed"), [])
+        self.assertEqual(search("mind"), [])
+        self.assertEqual(search("happiness"), [ids[1]])
+
+    def test_flush_removes_index_database(self):
+        from jumpscale.data.bcdb import flush
+
+        bcdb = BCDB("test")
+        quotes = bcdb.get_model_by_name("quote")
+        bcdb.indexer_text.set(quotes, quotes.load_obj_from_dict({"id": 1, "quote": "some text"}))
+        self.assertTrue(os.path.exists("test_index.db-wal"))
+
+        with mock.patch("os.system"):
+            flush.main()
+        for path in ("test_index.db", "test_index.db-wal", "test_index.db-shm"):
+            self.assertFalse(os.path.exists(path))
+
+        bcdb = BCDB("test")
+        self.assertEqual(bcdb.indexer_text.get(quotes, "quote", "text"), [])
@@ -0,0 +1,105 @@
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from jumpscale.entry_points import jsng
+
+
+@pytest.fixture
+def socket_path():
+    # unix socket paths are limited to ~100 characters, so do not use pytest's tmp_path
+    tmpdir = tempfile.mkdtemp(prefix="jsng")
+    yield os.path.join(tmpdir, "jsng.sock")
+    for name in os.listdir(tmpdir):
+        os.remove(os.path.join(tmpdir, name))
+    os.rmdir(tmpdir)
+
+
+def run_jsng(*args):
+    code = f"import sys; sys.argv = ['jsng', *{list(args)!r}]; from jumpscale.entry_points.jsng import run; run()"
+    return subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+
+
+def start_server(socket_path):
+    code = f"from jumpscale.entry_points.jsng import serve; serve({socket_path!r})"
+    server = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(600):
+        if os.path.exists(socket_path):
+            return server
+        time.sleep(0.1)
+
+    server.terminate()
+    server.wait()
+    pytest.fail("jsng server did not start")
+
+
+def test_run_through_server(socket_path):
+    server = start_server(socket_path)
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+        result = run_jsng("--socket", socket_path, "-c", "import os; print('pid', os.getpid())")
+        assert result.returncode == 0
+        # handled in a forked child of the server
+        pid = int(result.stdout.decode().split()[1])
+        assert pid not in (server.pid, os.getpid())
+
+        result = run_jsng("--socket", socket_path, "-c", "j.data.hash.md5('x')")
+        assert result.stdout.decode().strip() == "9dd4e461268c8034f5c8564e155c67a6"
+
+        result = run_jsng("--socket", socket_path, "-c", "raise ValueError('boom')")
+        assert result.returncode == 1
+        assert "ValueError: boom" in result.stderr.decode()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_fallback_to_local_without_server(socket_path):
+    with pytest.raises(OSError):
+        jsng.connect(socket_path)
+
+    result = run_jsng("--socket", socket_path, "-c", "j.data.hash.md5('x')")
+    assert result.returncode == 0
+    assert result.stdout.decode().strip() == "9dd4e461268c8034f5c8564e155c67a6"
+
+
+def test_server_is_not_replaced(socket_path):
+    server = start_server(socket_path)
+    try:
+        # another server does not take over the socket of a running one
+        code = f"import sys; from jumpscale.entry_points.jsng import serve; sys.exit(serve({socket_path!r}))"
+        result = subprocess.run([sys.executable, "-c", code], stderr=subprocess.PIPE, timeout=120)
+        assert result.returncode == 1
+        assert "another jsng server is listening" in result.stderr.decode()
+        jsng.connect(socket_path).close()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_stale_socket_is_removed(socket_path):
+    # left by a server that was killed
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    server = start_server(socket_path)
+    try:
+        for _ in range(600):
+            try:
+                jsng.connect(socket_path).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("jsng server did not start")
+    finally:
+        server.terminate()
+        server.wait()
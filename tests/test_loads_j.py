@@ -1,3 +1,58 @@
-
 def test_loading_j():
-    from jumpscale.god import j
\ No newline at end of file
+    from jumpscale.god import j
+
+
+def test_packages_are_loaded_lazily():
+    import subprocess
+    import sys
+
+    code = "\n".join(
+        [
+            "import sys",
+            "from jumpscale.god import j",
+            "assert 'docker' in dir(j.clients)",
+            "assert 'jumpscale.clients.docker' not in sys.modules",
+            "assert j.data.hash.md5('x')",
+            "assert 'jumpscale.data.hash' in sys.modules",
+        ]
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_modules_index_is_cached_and_invalidated(tmp_path, monkeypatch):
+    import os
+    import jumpscale
+    from jumpscale import god
+
+    # an extension project sharing `jumpscale` namespace (like js-ext)
+    ext = tmp_path / "js-ext" / "jumpscale"
+    pkg = ext / "clients" / "gitlab"
+    pkg.mkdir(parents=True)
+    (pkg / "__init__.py").write_text("def export_module_as():\n    return 1\n")
+
+    index_path = str(tmp_path / "modules_index.json")
+    monkeypatch.setattr(god, "MODULES_INDEX_PATH", index_path)
+    monkeypatch.setattr(jumpscale, "__path__", list(jumpscale.__path__) + [str(ext)])
+
+    namespaces = god.scanjsmodules()
+    assert namespaces["clients"]["gitlab"] == "jumpscale.clients.gitlab"
+    assert "redis" in namespaces["clients"]
+    assert os.path.exists(index_path)
+
+    paths = god.get_modules_index()
+    assert paths[str(ext)]["namespaces"]["clients"]["packages"]["gitlab"]["path"] == str(pkg)
+
+    # adding a new package changes the subnamespace mtime, it must be detected
+    (ext / "clients" / "gitea").mkdir()
+    # make sure the mtime differs on filesystems with coarse timestamps
+    stat = os.stat(ext / "clients")
+    os.utime(ext / "clients", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert "gitea" in god.scanjsmodules()["clients"]
+
+    # a subnamespace directory without packages yet (e.g. an empty `js-ext/jumpscale/tools`), must be checked too
+    (ext / "extras").mkdir()
+    assert "extras" not in god.scanjsmodules()
+    (ext / "extras" / "gitlab").mkdir()
+    stat = os.stat(ext / "extras")
+    os.utime(ext / "extras", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert god.scanjsmodules()["extras"]["gitlab"] == "jumpscale.extras.gitlab"
@@ -0,0 +1,29 @@
+from jumpscale.god import j
+
+
+def test_format_records_sorted_and_compared():
+    records = [
+        {"kind": "import", "name": "clients.fast", "seconds": 0.001, "error": None},
+        {"kind": "import", "name": "clients.slow", "seconds": 0.5, "error": None},
+        {"kind": "export", "name": "clients.broken", "seconds": 0.01, "error": "ImportError: boom"},
+    ]
+    previous = [{"kind": "import", "name": "clients.slow", "seconds": 0.25, "error": None}]
+
+    lines = j.tools.startupprofile.format_records(records, previous=previous).splitlines()
+    assert lines[0].split() == ["kind", "name", "ms", "previous", "ms", "diff", "ms"]
+    assert "clients.slow" in lines[1]
+    assert "+250.00" in lines[1]
+    assert "ImportError: boom" in lines[2]
+    assert "clients.fast" in lines[3]
+
+    lines = j.tools.startupprofile.format_records(records, limit=1).splitlines()
+    assert len(lines) == 2
+
+
+def test_preloaded_packages_are_reported_separately():
+    records = j.tools.startupprofile.profile_startup()
+    kinds = {record["name"]: record["kind"] for record in records if record["kind"] in ("import", "preloaded")}
+    # imported by jumpscale.god to register error handlers
+    assert kinds["tools.errorhandler"] == "preloaded"
+    assert kinds["tools.alerthandler"] == "preloaded"
+    assert kinds["data.hash"] == "import"